@@ -89,7 +89,8 @@ class TestServer():
 
         self.preconnection = taps.Preconnection(local_endpoint=lp,
                                                 transport_properties=tp,
-                                                security_parameters=sp)
+                                                security_parameters=sp,
+                                                event_loop=self.loop)
         self.preconnection.on_connection_received(
                                             self.handle_connection_received)
         self.preconnection.on_listen_error(self.handle_listen_error)
@@ -116,7 +117,16 @@ if __name__ == "__main__":
     args = ap.parse_args()
     print(args)
 
-    loop = asyncio.get_event_loop()
+    # Use the libuv based event loop if it is installed. pytaps has been
+    # imported already, so the loop is passed to the Preconnection
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     # Start testserver
     if args.reliable in ["yes", "true"]:
         server_tcp = TestServer(reliable="True")
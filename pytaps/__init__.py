@@ -4,6 +4,7 @@ from .connection import Connection
 from .transportProperties import TransportProperties, PreferenceLevel
 from .securityParameters import SecurityParameters
 from .utility import print_time, ConnectionState
+from .resolver import set_resolver
 from .framer import Framer, DeframingFailed
 from .listener import Listener
 from .multicast import do_join
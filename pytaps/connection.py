@@ -1,18 +1,178 @@
 import asyncio
+import copy
+import functools
+import itertools
 import json
+import logging
 import sys
 import ssl
-import netifaces
+from collections import deque
+from asyncio.staggered import staggered_race
 from .endpoint import LocalEndpoint, RemoteEndpoint
 from .transportProperties import *
 from .utility import *
 from .transports import *
-import ipaddress
+from .resolver import cached_getaddrinfo
 import socket
 color = "green"
+logger = logging.getLogger(__name__)
 
 # Wait for 100 ms between connection attempts when racing
 RACING_DELAY = 0.1
+# Maximum number of idle connections pooled per destination
+POOL_SIZE = 8
+# Close pooled connections that have not been reused for 30 s
+POOL_IDLE_TIMEOUT = 30
+
+# Address families as plain ints, compared against every resolved address
+_AF_INET = int(socket.AF_INET)
+_AF_INET6 = int(socket.AF_INET6)
+
+# Released connections per destination, see Connection.release
+_connection_pool = {}
+
+
+class _SessionCachingContext(ssl.SSLContext):
+    """ Client SSL context that keeps the last TLS session per server and
+        offers it again on the next handshake to that server, so that
+        reconnects can resume the session instead of performing a full
+        handshake.
+    """
+    # Maximum number of servers for which a session is kept
+    max_sessions = 64
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.sessions = {}
+
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side,
+                                server_hostname, session)
+
+    def remember_session(self, ssl_object):
+        """ Stores the session of an established TLS connection so it can
+            be resumed by the next connection to the same server.
+
+        Attributes:
+            ssl_object (SSLObject, required): SSL object of the connection.
+        """
+        if ssl_object is None or ssl_object.session is None:
+            return
+        server_hostname = ssl_object.server_hostname
+        if (server_hostname not in self.sessions and
+                len(self.sessions) >= self.max_sessions):
+            del self.sessions[next(iter(self.sessions))]
+        self.sessions[server_hostname] = ssl_object.session
+
+
+@functools.lru_cache(maxsize=32)
+def get_ssl_context(identity, trusted_ca):
+    """ Returns a client SSL context for the given identity and tuple of
+        trusted CAs. Contexts are cached, so connections sharing the same
+        security parameters reuse one context instead of reloading the
+        certificate chain from disk on every race, and can resume each
+        other's TLS sessions.
+    """
+    # Same setup as ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    security_context = _SessionCachingContext(ssl.PROTOCOL_TLS_CLIENT)
+    security_context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    if identity:
+        print_time("Identity: " + str(identity))
+        security_context.load_cert_chain(identity)
+    for cert in trusted_ca:
+        security_context.load_verify_locations(cert)
+    return security_context
+
+
+def _interleave(first, second):
+    """ Alternates the items of two lists, starting with the first one,
+        and appends what is left of the longer list. Used to alternate
+        between address families when racing, as recommended by RFC 8305.
+    """
+    missing = object()
+    return [item for pair in itertools.zip_longest(first, second,
+                                                   fillvalue=missing)
+            for item in pair if item is not missing]
+
+
+class _Candidate:
+    """ One combination of protocol, remote address and, if racing from
+        a local interface, local address to attempt a connection with.
+    """
+    __slots__ = ("protocol", "remote_address", "local_address")
+
+    def __init__(self, protocol, remote_address, local_address=None):
+        self.protocol = protocol
+        self.remote_address = remote_address
+        self.local_address = local_address
+
+    def __repr__(self):
+        return "(" + ", ".join(
+            str(field) for field in (self.protocol, self.remote_address,
+                                     self.local_address)
+            if field is not None) + ")"
+
+
+async def _cancel_others(pending, exclude=None):
+    """ Cancels all tasks in pending except exclude and waits for them
+        to finish, so that sockets of losing attempts are closed right
+        away instead of whenever the tasks get to run again.
+    """
+    others = [task for task in pending
+              if task is not exclude and not task.done()]
+    for task in others:
+        task.cancel()
+    if others:
+        await asyncio.gather(*others, return_exceptions=True)
+
+
+def pool_key(preconnection):
+    """ Returns the key under which connections initiated from
+        preconnection are pooled. Only connections to the same remote
+        endpoint, with the same local endpoint, transport properties,
+        security parameters, framer and event loop are interchangeable.
+    """
+    remote = preconnection.remote_endpoint
+    local = preconnection.local_endpoint
+    security = preconnection.security_parameters
+    # Racing stores the address it connected to on the remote endpoint,
+    # so only use the addresses if there is no host name to resolve
+    if remote.host_name is not None:
+        destination = remote.host_name
+    elif isinstance(remote.address, str):
+        destination = (remote.address,)
+    else:
+        destination = tuple(remote.address)
+    return (preconnection.loop, destination, remote.port,
+            None if local is None else
+            (str(local.interface), str(local.address), local.port),
+            frozenset(preconnection.transport_properties.properties.items()),
+            None if not security else
+            (security.identity, tuple(sorted(security.trustedCA))),
+            preconnection.framer)
+
+
+def take_pooled(key):
+    """ Returns a released connection that is still usable from the
+        pool for key, or None. Connections that were closed, received
+        data or EOF while they were pooled are closed and dropped.
+    """
+    idle = _connection_pool.get(key)
+    connection = None
+    while idle:
+        candidate = idle.pop()
+        candidate.pool_timer.cancel()
+        if candidate._is_reusable():
+            connection = candidate
+            break
+        if candidate.state is ConnectionState.ESTABLISHED:
+            candidate.close()
+    if idle is not None and not idle:
+        del _connection_pool[key]
+    return connection
 
 
 class Connection():
@@ -33,15 +193,24 @@ class Connection():
         self.active = preconnection.active
         self.framer = preconnection.framer
         self.set_callbacks(preconnection)
-        self.sleeper_for_racing = SleepClassForRacing()
-        self.pending = []
+        # Tasks of the candidate attempts that are still running
+        self.pending = set()
         # Security Context for SSL
         self.security_context = None
         # Current state of the connection object
         self.state = ConnectionState.ESTABLISHING
-        # List of possible underlying transports
-        self.transports = []
+        # Underlying transport, set once the connection is established
+        self.transport = None
+        # Set by the transport once the peer has sent EOF
+        self.at_eof = False
         self.multicast_open = False
+        # Task racing the candidates, set by Preconnection.initiate
+        self.race_task = None
+        # Pool the connection is returned to by release, set by
+        # Preconnection.initiate_with_pool
+        self.pool_key = None
+        # Closes the connection if it stays unused in the pool
+        self.pool_timer = None
 
     async def race(self):
         # This is an active connection attempt
@@ -53,69 +222,64 @@ class Connection():
         if len(protocol_candidates) == 0:
             print_time("Candidate set is empty, aborting", color)
             if self.initiate_error is not None:
-                self.loop.create_task(self.initiate_error())
+                schedule_callback(self.loop, self.initiate_error)
             return
-        # If security_parameters were given, initialize ssl context
-        if self.security_parameters:
-            self.security_context = ssl.create_default_context(
-                                                ssl.Purpose.SERVER_AUTH)
-            if self.security_parameters.identity:
-                print_time("Identity: " +
-                           str(self.security_parameters.identity))
-                self.security_context.load_cert_chain(
-                                        self.security_parameters.identity)
-            for cert in self.security_parameters.trustedCA:
-                self.security_context.load_verify_locations(cert)
-
-        if self.remote_endpoint.host_name is not None:
+        # Whether to start racing with IPv4 instead of IPv6
+        v4_first = False
+        host_name = self.remote_endpoint.host_name
+        if host_name is not None and not is_ip_literal(host_name):
             # Resolve address
             # FIXME: Unfortunately, asyncio getaddrinfo does not
             # FIXME: allow to resolve on specific interfaces
             # FIXME: Consider migrating to something better, e.g., getdns
-            remote_info = await self.loop.getaddrinfo(
-                self.remote_endpoint.host_name, self.remote_endpoint.port)
-            # Concat v6 and v4 address lists, making sure we try v6 first
-            remote_addrs_v6 = list(
-                    set([
-                        info[4][0] for info in remote_info
-                        if info[0] == socket.AddressFamily.AF_INET6]
-                        )
-                )
-            remote_addrs_v4 = list(
-                    set([
-                        info[4][0] for info in remote_info
-                        if info[0] == socket.AddressFamily.AF_INET]
-                        )
-                )
-            remote_addrs = remote_addrs_v6 + remote_addrs_v4
-            print_time("Resolved " + str(self.remote_endpoint.host_name) +
-                       " to " + str(remote_addrs), color)
+            remote_info = await cached_getaddrinfo(
+                self.loop, self.remote_endpoint.host_name,
+                self.remote_endpoint.port)
+            # Split addresses by family in one pass, dropping duplicates
+            # while keeping the order in which the resolver returned them
+            v6, v4 = {}, {}
+            for family, _, _, _, sockaddr in remote_info:
+                if family == _AF_INET6:
+                    v6[sockaddr[0]] = None
+                elif family == _AF_INET:
+                    v4[sockaddr[0]] = None
+            remote_addrs_v6, remote_addrs_v4 = list(v6), list(v4)
+            # Alternate between v6 and v4 addresses, starting with the
+            # family of the address the resolver ranked first (RFC 6724)
+            v4_first = bool(remote_info) and (
+                remote_info[0][0] == _AF_INET)
+            if v4_first:
+                remote_addrs = _interleave(remote_addrs_v4, remote_addrs_v6)
+            else:
+                remote_addrs = _interleave(remote_addrs_v6, remote_addrs_v4)
+            logger.debug("Resolved %s to %s",
+                         self.remote_endpoint.host_name, remote_addrs)
 
         else:
-            remote_addrs = self.remote_endpoint.address
-            print_time("Not resolving - using address " +
-                       str(self.remote_endpoint.address) + " --> " +
-                       str(remote_addrs), color)
+            # The host name is an address literal or addresses were given
+            if host_name is not None:
+                remote_addrs = [host_name]
+            elif isinstance(self.remote_endpoint.address, str):
+                remote_addrs = [self.remote_endpoint.address]
+            else:
+                remote_addrs = list(self.remote_endpoint.address)
+            remote_addrs_v6 = [address for address in remote_addrs
+                               if ":" in address]
+            remote_addrs_v4 = [address for address in remote_addrs
+                               if ":" not in address]
+            logger.debug("Not resolving - using address %s",
+                         remote_addrs)
 
         if self.local_endpoint is not None:
             # Local interface specified -->
             # try local addresses on that interface
             for local_interface in self.local_endpoint.interface:
                 try:
-                    # Unfortunately, link-local IPv6 addresses don't work
-                    # because they're broken in
-                    # asyncio: https://bugs.python.org/issue35545
-                    local_v6_addrs = [entry['addr']
-                                      for entry in netifaces.ifaddresses
-                                      (local_interface)[netifaces.AF_INET6]
-                                      if entry['addr'][:4] != "fe80"]
-                    local_v4_addrs = [entry['addr']
-                                      for entry in netifaces.ifaddresses
-                                      (local_interface)[netifaces.AF_INET]]
-                    print_time("Trying addresses of local interface " +
-                               str(self.local_endpoint.interface) + " --> " +
-                               str(local_v6_addrs) + ", " +
-                               str(local_v4_addrs), color)
+                    local_v6_addrs, local_v4_addrs = iface_addrs(
+                        local_interface)
+                    logger.debug("Trying addresses of local interface "
+                                 "%s --> %s, %s", local_interface,
+                                 local_v6_addrs, local_v4_addrs)
                 except ValueError as err:
                     print_time("Cannot get IP addresses for " +
                                str(self.local_endpoint.interface) + ": " +
@@ -123,95 +287,136 @@ class Connection():
                     # TODO throw error
             # Build candidate set for racing
             # based on combinations of protocol, local and remote IP address
-            candidate_set = [protocol + (remote_address,) + (local_address,)
-                             for remote_address in remote_addrs_v6
-                             for protocol in protocol_candidates
-                             for local_address in local_v6_addrs]
-            candidate_set += [protocol + (remote_address,) + (local_address,)
-                              for remote_address in remote_addrs_v4
-                              for protocol in protocol_candidates
-                              for local_address in local_v4_addrs]
-            print_time("Final Candidates: " + str(candidate_set))
+            candidates_v6 = [_Candidate(protocol[0], remote_address,
+                                        local_address)
+                             for remote_address, protocol, local_address
+                             in itertools.product(remote_addrs_v6,
+                                                  protocol_candidates,
+                                                  local_v6_addrs)]
+            candidates_v4 = [_Candidate(protocol[0], remote_address,
+                                        local_address)
+                             for remote_address, protocol, local_address
+                             in itertools.product(remote_addrs_v4,
+                                                  protocol_candidates,
+                                                  local_v4_addrs)]
+            if v4_first:
+                candidate_set = _interleave(candidates_v4, candidates_v6)
+            else:
+                candidate_set = _interleave(candidates_v6, candidates_v4)
+            logger.debug("Final Candidates: %s", candidate_set)
 
         else:
             # Build candidate set for racing
             # based on combinations of protocol and remote IP address
-            candidate_set = [protocol + (address,)
-                             for address in remote_addrs
-                             for protocol in protocol_candidates]
-
-        # Attempt to establish a connection with each candidate
-        for candidate in candidate_set:
-
-            if self.state == ConnectionState.ESTABLISHED:
-                print_time("Connection established -- stop racing", color)
-                break
-
-            print_time("Trying candidate protocol: " + str(candidate[0]) +
-                       " and remote address: " + str(candidate[2]) +
-                       (" and local address: " + str(candidate[3])
-                       if len(candidate) > 3 else ""), color)
-            if len(candidate) > 3:
-                # bind to a specific local address
-                local_address_to_use = (candidate[3], None)
-                self.local_endpoint.address = candidate[3]
-            else:
-                local_address_to_use = None
-
-            if candidate[0] == 'udp':
-                self.protocol = 'udp'
-                print_time("Creating UDP connect task with remote addr " +
-                           str(candidate[2]) + ", port " +
-                           str(self.remote_endpoint.port), color)
-                self.remote_endpoint.address = candidate[2]
-                if not self.local_endpoint:
-                    if self.initiate_error:
-                        self.loop.create_task(self.initiate_error(self))
-
-                # Create a datagram endpoint
-                task = self.loop.create_task(
-                    self.loop.create_datagram_endpoint(
-                        lambda: UdpTransport(
-                                    connection=self,
-                                    remote_endpoint=self.remote_endpoint),
-                        remote_addr=(self.remote_endpoint.address,
-                                     self.remote_endpoint.port),
-                        local_addr=local_address_to_use))
-
-                print_time("Not racing multiple addrs for UDP" +
-                           " -- stop racing", color)
-                break
-
-            elif candidate[0] == 'tcp':
-                self.protocol = 'tcp'
-                print_time("Creating TCP connect task to " + candidate[2] +
-                           ".", color)
-                self.remote_endpoint.address = candidate[2]
-                # If the protocol is tcp, create a asyncio connection
-                task = self.loop.create_task(
-                        self.loop.create_connection(
-                            lambda: TcpTransport(
-                                connection=self,
-                                remote_endpoint=self.remote_endpoint),
-                            self.remote_endpoint.address,
-                            self.remote_endpoint.port,
-                            ssl=self.security_context,
-                            server_hostname=(
-                                self.remote_endpoint.host_name
-                                if self.security_context else None),
-                            local_addr=local_address_to_use))
-                # Wait before starting next connection attempt
-                await self.sleeper_for_racing.sleep(RACING_DELAY)
+            candidate_set = [_Candidate(protocol[0], address)
+                             for address, protocol
+                             in itertools.product(remote_addrs,
+                                                  protocol_candidates)]
+
+        # Attempt to establish a connection with each candidate, starting
+        # the next attempt after RACING_DELAY or as soon as the previous
+        # one failed. The first successful attempt wins, the others
+        # are cancelled.
+        attempts = [functools.partial(self.attempt_candidate, candidate)
+                    for candidate in candidate_set]
+        try:
+            winner, index, exceptions = await staggered_race(
+                attempts, RACING_DELAY, loop=self.loop)
+        finally:
+            # staggered_race cancels the other attempts once one wins and
+            # waits for them, asyncio then closes the transports they were
+            # still setting up. If race itself is cancelled, staggered_race
+            # does not wait, so wait here for the attempts still running
+            await _cancel_others(self.pending)
+
+        if winner is None:
+            print_time("All candidates failed: " + str(exceptions), color)
+            if self.initiate_error:
+                schedule_callback(self.loop, self.initiate_error, self)
+            return
+
+        print_time("Connection established -- stop racing", color)
+        transport, protocol = winner
+        self.protocol = candidate_set[index].protocol
+        # The endpoints are shared with the preconnection, record the
+        # addresses the winner uses on copies of them
+        self.remote_endpoint = copy.copy(self.remote_endpoint)
+        self.remote_endpoint.address = protocol.remote_address
+        protocol.remote_endpoint = self.remote_endpoint
+        if protocol.local_address is not None:
+            self.local_endpoint = copy.copy(self.local_endpoint)
+            self.local_endpoint.address = protocol.local_address
+        self.transport = protocol
+        await protocol.active_open(transport)
+
+    async def attempt_candidate(self, candidate):
+        """ Tries to establish a transport for one candidate.
+
+        Attributes:
+            candidate (_Candidate, required): Protocol, remote address
+                and optionally the local address to use.
+        """
+        protocol = candidate.protocol
+        remote_address = candidate.remote_address
+        local_address = candidate.local_address
+        remote_endpoint = self.remote_endpoint
+        port = remote_endpoint.port
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Trying candidate protocol: %s and remote address: "
+                         "%s%s", protocol, remote_address,
+                         " and local address: " + str(local_address)
+                         if local_address is not None else "")
+        attempt = asyncio.current_task()
+        self.pending.add(attempt)
+        attempt.add_done_callback(self.pending.discard)
+        if local_address is not None:
+            # bind to a specific local address
+            local_address_to_use = (local_address, None)
+        else:
+            local_address_to_use = None
+
+        if protocol == 'udp':
+            logger.debug("Creating UDP connect task with remote addr %s, "
+                         "port %s", remote_address, port)
+            if not self.local_endpoint:
+                if self.initiate_error:
+                    schedule_callback(self.loop, self.initiate_error, self)
+
+            # Create a datagram endpoint
+            return await self.loop.create_datagram_endpoint(
+                functools.partial(UdpTransport, connection=self,
+                                  remote_endpoint=remote_endpoint,
+                                  remote_address=remote_address,
+                                  local_address=local_address),
+                remote_addr=(remote_address, port),
+                local_addr=local_address_to_use)
+
+        elif protocol == 'tcp':
+            logger.debug("Creating TCP connect task to %s.", remote_address)
+            security_context = self.security_context
+            # If the protocol is tcp, create a asyncio connection
+            return await self.loop.create_connection(
+                functools.partial(TcpTransport, connection=self,
+                                  remote_endpoint=remote_endpoint,
+                                  remote_address=remote_address,
+                                  local_address=local_address),
+                remote_address,
+                port,
+                ssl=security_context,
+                server_hostname=(
+                    remote_endpoint.host_name if security_context else None),
+                local_addr=local_address_to_use)
+
+        raise ValueError("Protocol " + str(protocol) + " is not supported")
 
     async def send_message(self, data):
         """ Attempts to send data on the connection.
             Attributes:
-                data (string, required):
-                    Data to be send.
+                data (bytes or string, required):
+                    Data to be send. Bytes-like data is sent as is,
+                    strings are UTF-8 encoded.
         """
-        if isinstance(data, str):
-            data = data.encode()
-        return self.transports[0].send(data)
+        return self.transport.send(data)
 
     async def receive(self, min_incomplete_length=float("inf"), max_length=-1):
         """ Queues the reception of a message.
@@ -222,62 +427,85 @@ class Connection():
             max_length (integer, optional):
                 The maximum length a message can have.
         """
-        self.transports[0].receive(min_incomplete_length, max_length)
+        self.transport.receive(min_incomplete_length, max_length)
 
     def close(self):
         """ Attempts to close the connection, issues a closed event
         on success.
         """
+        if self.transport is None:
+            # Still racing, stop the remaining attempts
+            if self.race_task is not None:
+                self.race_task.cancel()
+            self.state = ConnectionState.CLOSED
+            if self.closed:
+                schedule_callback(self.loop, self.closed, self)
+            return
         if self.multicast_open:
             self.loop.create_task(self.multicast_leave())
-        self.loop.create_task(self.transports[0].close())
+        self.loop.create_task(self.transport.close())
         self.state = ConnectionState.CLOSING
 
+    def release(self):
+        """ Hands an established connection back for reuse by
+            Preconnection.initiate_with_pool, instead of closing it.
+            The connection must not be used after releasing it.
+            Connections that were not created by initiate_with_pool,
+            are not established or still have unread data are closed.
+            Pooled connections are closed once they have been idle for
+            POOL_IDLE_TIMEOUT seconds, or to make room when more than
+            POOL_SIZE connections to the same destination are released.
+        """
+        if self.pool_key is None:
+            self.close()
+            return
+        if not self._is_reusable():
+            self.close()
+            return
+        # Events of the idle connection must not reach the previous user
+        self.ready = self.sent = self.send_error = self.received = None
+        self.received_partial = self.receive_error = None
+        self.connection_error = self.closed = None
+        idle = _connection_pool.setdefault(self.pool_key, deque())
+        if len(idle) >= POOL_SIZE:
+            # Close the connection that has been idle the longest
+            oldest = idle.popleft()
+            oldest.pool_timer.cancel()
+            oldest.close()
+        self.pool_timer = self.loop.call_later(POOL_IDLE_TIMEOUT,
+                                               self._expire_pooled)
+        idle.append(self)
+
+    def _is_reusable(self):
+        """ Returns True if the connection is established and nothing was
+            received on it that the next user could mistake for its own.
+        """
+        transport = self.transport
+        return (self.state is ConnectionState.ESTABLISHED and
+                not transport.transport.is_closing() and
+                not self.at_eof and not transport.recv_buffer and
+                not transport.waiters and
+                not getattr(transport, "framer_buffer", None))
+
+    def _expire_pooled(self):
+        """ Removes the connection from the pool and closes it, called
+            once it has been idle for POOL_IDLE_TIMEOUT seconds.
+        """
+        idle = _connection_pool.get(self.pool_key)
+        if idle is not None:
+            try:
+                idle.remove(self)
+            except ValueError:
+                pass
+            if not idle:
+                del _connection_pool[self.pool_key]
+        self.close()
+
     def create_candidates(self):
         """ Decides which protocols are candidates and then orders them
         according to the TAPS interface draft
         """
-        # Get the protocols know to the implementation from transportProperties
-        available_protocols = get_protocols()
-
-        # At the beginning, all protocols are candidates
-        candidate_protocols = dict([(row["name"], list((0, 0)))
-                                   for row in available_protocols])
-
-        # Iterate over all available protocols and over all properties
-        for protocol in available_protocols:
-            for transport_property in self.transport_properties.properties:
-                # If a protocol has a prohibited property remove it
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.PROHIBIT):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        del candidate_protocols[protocol["name"]]
-                # If a protocol doesnt have a required property remove it
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.REQUIRE):
-                    if (protocol[transport_property] is False and
-                            protocol["name"] in candidate_protocols):
-                        del candidate_protocols[protocol["name"]]
-                # Count how many PREFER properties each protocol has
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.PREFER):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        candidate_protocols[protocol["name"]][0] += 1
-                # Count how many AVOID properties each protocol has
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.AVOID):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        candidate_protocols[protocol["name"]][1] -= 1
-
-        # Sort candidates by number of PREFERs and then by AVOIDs on ties
-        sorted_candidates = sorted(candidate_protocols.items(),
-                                   key=lambda value: (value[1][0],
-                                   value[1][1]), reverse=True)
-
-        return sorted_candidates
+        return self.transport_properties.select_protocols()
 
     def parse(self, min_incomplete_length=0, max_length=0):
         """ Returns the message buffer of the
@@ -288,7 +516,7 @@ class Connection():
                 The connection object from which the
                 buffer should be returned.
         """
-        return self.transports[0].recv_buffer, None, False
+        return self.transport.recv_buffer, None, False
 
     def set_callbacks(self, preconnection):
         self.ready = preconnection.ready
@@ -1,7 +1,10 @@
 import asyncio
+import functools
+import logging
+import os
 import ssl
-import ipaddress
-import netifaces
+import socket
+from collections import OrderedDict
 from .connection import Connection
 from .securityParameters import SecurityParameters
 from .transportProperties import *
@@ -9,8 +12,44 @@ from .endpoint import LocalEndpoint, RemoteEndpoint
 from .utility import *
 from .transports import *
 from .multicast import do_join, do_leave
+from .resolver import cached_getaddrinfo
 
 color = "cyan"
+logger = logging.getLogger(__name__)
+
+# Receive buffer of UDP listener sockets, which are shared by all flows and
+# are only drained once per event loop iteration
+UDP_LISTENER_RCVBUF = 4 << 20
+# Number of UDP flows a listener keeps apart by remote address, set with
+# PYTAPS_UDP_MAX_FLOWS, the least recently active flow is forgotten first
+UDP_MAX_FLOWS = positive_number_from_env("PYTAPS_UDP_MAX_FLOWS", 4096,
+                                         int)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_server_ssl_context(identity, trusted_ca, versions):
+    """ Returns a server SSL context for the given identity and tuple of
+        trusted CAs. Contexts are cached, so restarting a listener does not
+        parse the certificates again. versions only serves as part of the
+        cache key, see _load_server_ssl_context.
+    """
+    security_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    if identity:
+        print_time("Identity: " + str(identity))
+        security_context.load_cert_chain(identity)
+    for cert in trusted_ca:
+        security_context.load_verify_locations(cert)
+    return security_context
+
+
+def _load_server_ssl_context(identity, trusted_ca):
+    """ Returns the cached server SSL context for the given identity and
+        trusted CAs, building a new one if any of the certificate files
+        has been modified since.
+    """
+    versions = tuple(os.stat(path).st_mtime_ns
+                     for path in (identity,) + trusted_ca if path)
+    return _get_server_ssl_context(identity, trusted_ca, versions)
 
 
 class Listener():
@@ -21,6 +60,14 @@ class Listener():
                 Preconnection object from which this Connection
                 object was created.
     """
+    # handler is set by DatagramHandler, _join_ctx by multicast.do_join
+    __slots__ = ("preconnection", "local_endpoint", "remote_endpoint",
+                 "transport_properties", "security_parameters", "loop",
+                 "active", "framer", "security_context", "active_ports",
+                 "ready", "initiate_error", "connection_received",
+                 "listen_error", "stopped", "multicast_open",
+                 "multicast_false", "handler", "_join_ctx", "reuse_port")
+
     def __init__(self, preconnection):
         # Initializations
         self.preconnection = preconnection
@@ -31,6 +78,7 @@ class Listener():
         self.loop = preconnection.loop
         self.active = preconnection.active
         self.framer = preconnection.framer
+        self.reuse_port = preconnection.reuse_port
         self.security_context = None
         self.set_callbacks(preconnection)
         self.active_ports = {}
@@ -47,168 +95,129 @@ class Listener():
         # Create set of candidate protocols
         protocol_candidates = self.create_candidates()
 
-        if self.remote_endpoint is not None:
-            if not self.remote_endpoint.address:
-                remote_info = await self.loop.getaddrinfo(
-                    self.remote_endpoint.host_name, self.remote_endpoint.port)
-                self.remote_endpoint.address = [remote_info[0][4][0]]
         # If the candidate set is empty issue an InitiateError cb
         if not protocol_candidates:
             print_time("Protocol selection Error occured.", color)
             if self.listen_error:
-                self.loop.create_task(self.listen_error())
+                schedule_callback(self.loop, self.listen_error)
             return
 
-        # If security_parameters were given, initialize ssl context
+        # Resolve the remote and local host names concurrently, address
+        # literals are used as they are
+        lookups = {}
+        if (self.remote_endpoint is not None and
+                not self.remote_endpoint.address):
+            remote_host_name = self.remote_endpoint.host_name
+            if (remote_host_name is not None and
+                    is_ip_literal(remote_host_name)):
+                self.remote_endpoint.address = [remote_host_name]
+            else:
+                lookups["remote"] = cached_getaddrinfo(
+                    self.loop, remote_host_name, self.remote_endpoint.port)
+        local_host_name = self.local_endpoint.host_name
+        if local_host_name is not None and not is_ip_literal(local_host_name):
+            lookups["local"] = cached_getaddrinfo(
+                self.loop, local_host_name, self.local_endpoint.port)
+        resolved = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+        if "remote" in resolved:
+            self.remote_endpoint.address = [resolved["remote"][0][4][0]]
+
+        # If security_parameters were given, initialize ssl context,
+        # loading the certificates from disk outside of the event loop
         if self.security_parameters:
-            self.security_context = ssl.create_default_context(
-                                                ssl.Purpose.CLIENT_AUTH)
-            if self.security_parameters.identity:
-                print_time("Identity: " +
-                           str(self.security_parameters.identity))
-                self.security_context.load_cert_chain(
-                                        self.security_parameters.identity)
-            for cert in self.security_parameters.trustedCA:
-                self.security_context.load_verify_locations(cert)
-
-        all_addrs = []
-        if self.local_endpoint.host_name is not None:
-            endpoint_info = await self.loop.getaddrinfo(
-                self.local_endpoint.host_name, self.local_endpoint.port)
-            all_addrs += list(set([info[4][0] for info in endpoint_info]))
+            self.security_context = await self.loop.run_in_executor(
+                None, _load_server_ssl_context,
+                self.security_parameters.identity,
+                tuple(sorted(self.security_parameters.trustedCA)))
+
+        # Collect the addresses to listen on in a dict, which drops
+        # duplicates while keeping the order in which they were found
+        all_addrs = {}
+        if "local" in resolved:
+            all_addrs.update(dict.fromkeys(info[4][0]
+                                           for info in resolved["local"]))
             print_time("Resolved " + str(self.local_endpoint.host_name) +
-                       " to " + str(all_addrs), color)
+                       " to " + str(list(all_addrs)), color)
+        elif local_host_name is not None:
+            all_addrs[local_host_name] = None
         if len(self.local_endpoint.address) > 0:
-            all_addrs += self.local_endpoint.address
+            all_addrs.update(dict.fromkeys(self.local_endpoint.address))
             print_time("Adding addresses to listen: " +
                        str(self.local_endpoint.address) + " --> " +
-                       str(all_addrs), color)
+                       str(list(all_addrs)), color)
         if self.local_endpoint.interface is not None:
             for local_interface in self.local_endpoint.interface:
                 try:
-                    # Unfortunately, listening on link-local
-                    # IPv6 addresses does not work
-                    # because it's broken in asyncio:
-                    # https://bugs.python.org/issue35545
-                    all_addrs += [entry['addr']
-                                  for entry in netifaces.ifaddresses
-                                  (local_interface)[netifaces.AF_INET6]
-                                  if entry['addr'][:4] != "fe80"]
-                    all_addrs += [entry['addr']
-                                  for entry in netifaces.ifaddresses
-                                  (local_interface)[netifaces.AF_INET]]
-                    print_time("Adding addresses of local interface " +
-                               str(self.local_endpoint.interface) + " --> " +
-                               str(all_addrs), color)
+                    # Link-local IPv6 addresses are left out, listening on
+                    # them is broken in asyncio. Reading the addresses
+                    # takes ioctls, so keep them off the event loop
+                    local_v6_addrs, local_v4_addrs = \
+                        await self.loop.run_in_executor(
+                            None, iface_addrs, local_interface)
                 except ValueError as err:
                     print_time("Cannot get IP addresses for " +
-                               str(self.local_endpoint.interface) + ": " +
-                               str(err), color)
+                               str(local_interface) + ": " + str(err), color)
+                    continue
+                all_addrs.update(dict.fromkeys(local_v6_addrs))
+                all_addrs.update(dict.fromkeys(local_v4_addrs))
+            print_time("Adding addresses of local interface " +
+                       str(self.local_endpoint.interface) + " --> " +
+                       str(list(all_addrs)), color)
+
+        # Listen with every candidate protocol on every address at once
+        await asyncio.gather(*(self._bind_one(protocol[0], address)
+                               for address in all_addrs
+                               for protocol in protocol_candidates))
+        return
 
-        # Get all combinations of protocols and remote IP addresses
-        # to listen on all of them
-        candidate_set = [protocol + (address,)
-                         for address in all_addrs
-                         for protocol in protocol_candidates]
+    async def _bind_one(self, protocol, address):
+        """ Sets up the listener of one candidate protocol on one local
+            address, issuing a ListenError cb if that fails.
+        """
+        port = self.local_endpoint.port
+        try:
+            if protocol == 'udp':
+                print_time("UDP local endpoint: address " + str(address) +
+                           " port: " + str(port), color)
+                # See if the address of the local endpoint
+                # is a multicast address
+                if is_multicast_address(address):
+                    print_time("addr is multicast", color)
+                    # If the address is multicast, make sure that the
+                    # application set the direction of communication
+                    # to receive only
+                    if self.transport_properties.properties.\
+                       get('direction') == 'unidirection-receive':
+                        print_time("direction is unicast receive", color)
+                        self.loop.create_task(self.multicast_join(address))
+                else:
+                    await self.loop.create_datagram_endpoint(
+                                    functools.partial(DatagramHandler, self),
+                                    local_addr=(address, port),
+                                    reuse_port=self.reuse_port)
+            elif protocol == 'tcp':
+                print_time("TCP local endpoint: address " + str(address) +
+                           " port: " + str(port))
+                await self.loop.create_server(
+                                functools.partial(StreamHandler, self),
+                                address,
+                                port,
+                                ssl=self.security_context,
+                                reuse_port=self.reuse_port)
+        except Exception as err:
+            print_time("Listen Error occured: " + str(err), color)
+            if self.listen_error:
+                schedule_callback(self.loop, self.listen_error)
+            return
 
-        # Attempt to set up the appropriate listener for the candidate protocol
-        for candidate in candidate_set:
-            try:
-                if candidate[0] == 'udp':
-                    self.protocol = 'udp'
-                    self.local_endpoint.address = [candidate[2]]
-                    multicast_receiver = False
-                    # See if the address of the local endpoint
-                    # is a multicast address
-                    print_time("UDP local endpoint: address " +
-                               str(self.local_endpoint.address) +
-                               " port: " +
-                               str(self.local_endpoint.port), color)
-                    check_addr = ipaddress.ip_address(
-                                  self.local_endpoint.address[0])
-                    if check_addr.is_multicast:
-                        print_time("addr is multicast", color)
-                        # If the address is multicast, make sure that the
-                        # application set the direction of communication
-                        # to receive only
-                        if self.transport_properties.properties.\
-                           get('direction') == 'unidirection-receive':
-                            print_time("direction is unicast receive", color)
-                            multicast_receiver = True
-                            self.loop.create_task(self.multicast_join())
-                    else:
-                        await self.loop.create_datagram_endpoint(
-                                        lambda: DatagramHandler(self),
-                                        local_addr=(
-                                            self.local_endpoint.address[0],
-                                            self.local_endpoint.port))
-                elif candidate[0] == 'tcp':
-                    self.protocol = 'tcp'
-                    self.local_endpoint.address = [candidate[2]]
-                    print_time("TCP local endpoint: address " +
-                               str(self.local_endpoint.address) +
-                               " port: " + str(self.local_endpoint.port))
-                    server = await self.loop.create_server(
-                                    lambda: StreamHandler(self),
-                                    self.local_endpoint.address[0],
-                                    self.local_endpoint.port,
-                                    ssl=self.security_context)
-            except Exception as err:
-                print_time("Listen Error occured: " + str(err), color)
-                if self.listen_error:
-                    self.loop.create_task(self.listen_error())
-
-            print_time("Started " + self.protocol + " Listener on " +
-                       (str(self.local_endpoint.address) if
-                        self.local_endpoint.address else "default") + ":" +
-                       str(self.local_endpoint.port), color)
-        return
+        print_time("Started " + protocol + " Listener on " + str(address) +
+                   ":" + str(port), color)
 
     def create_candidates(self):
         """ Decides which protocols are candidates and then orders them
         according to the TAPS interface draft
         """
-        # Get the protocols know to the implementation from transportProperties
-        available_protocols = get_protocols()
-
-        # At the beginning, all protocols are candidates
-        candidate_protocols = dict([(row["name"], list((0, 0)))
-                                   for row in available_protocols])
-
-        # Iterate over all available protocols and over all properties
-        for protocol in available_protocols:
-            for transport_property in self.transport_properties.properties:
-                # If a protocol has a prohibited property remove it
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.PROHIBIT):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        del candidate_protocols[protocol["name"]]
-                # If a protocol doesnt have a required property remove it
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.REQUIRE):
-                    if (protocol[transport_property] is False and
-                            protocol["name"] in candidate_protocols):
-                        del candidate_protocols[protocol["name"]]
-                # Count how many PREFER properties each protocol has
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.PREFER):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        candidate_protocols[protocol["name"]][0] += 1
-                # Count how many AVOID properties each protocol has
-                if (self.transport_properties.properties[transport_property]
-                        is PreferenceLevel.AVOID):
-                    if (protocol[transport_property] is True and
-                            protocol["name"] in candidate_protocols):
-                        candidate_protocols[protocol["name"]][1] -= 1
-
-        # Sort candidates by number of PREFERs and then by AVOIDs on ties
-        sorted_candidates = sorted(candidate_protocols.items(),
-                                   key=lambda value: (value[1][0],
-                                   value[1][1]), reverse=True)
-
-        return sorted_candidates
+        return self.transport_properties.select_protocols()
 
     def set_callbacks(self, preconnection):
         self.ready = preconnection.ready
@@ -219,11 +228,11 @@ class Listener():
 
     """ ASYNCIO function that gets called when joining a multicast flow
     """
-    async def multicast_join(self):
+    async def multicast_join(self, address=None):
         print_time("joining multicast session.", color)
         self.multicast_open = True
         handler = DatagramHandler(self)
-        do_join(self)
+        do_join(self, address)
 
     """ ASYNCIO function that receives data from multicast flows
     """
@@ -242,79 +251,106 @@ class Listener():
 class DatagramHandler(asyncio.Protocol):
     """ Class required to handle incoming datagram flows
     """
+    __slots__ = ("preconnection", "remotes", "transport")
+
     def __init__(self, preconnection):
         self.preconnection = preconnection
-        self.remotes = dict()
+        self.remotes = OrderedDict()
         self.preconnection.handler = self
         self.transport = None
 
     def connection_made(self, transport):
         self.transport = transport
         print_time("New UDP flow", color)
+        # Make room for bursts of datagrams arriving between two reads
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                UDP_LISTENER_RCVBUF)
+            except OSError as err:
+                print_time("Could not set receive buffer: " + str(err),
+                           color)
         return
 
     def datagram_received(self, data, addr):
-        print_time("Received new datagram", color)
-        if addr in self.remotes:
-            self.remotes[addr].transports[0].datagram_received(data, addr)
+        logger.debug("Received new datagram")
+        # Datagrams of known flows are the hot path, look them up once and
+        # hand them straight to the transport of their connection
+        deliver = self.remotes.get(addr)
+        if deliver is not None:
+            self.remotes.move_to_end(addr)
+            deliver(data, addr)
             return
         new_connection = Connection(self.preconnection)
         new_connection.state = ConnectionState.ESTABLISHED
         new_remote_endpoint = RemoteEndpoint()
-        print_time("Received new connection from " +
-                   str(addr[0]) + ":" + str(addr[1]) + ".", color)
+        logger.debug("Received new connection from %s:%s.",
+                     addr[0], addr[1])
         new_remote_endpoint.with_address(addr[0])
         new_remote_endpoint.with_port(addr[1])
         new_connection.remote_endpoint = new_remote_endpoint
-        print_time("Created new connection object.", color)
         new_udp = UdpTransport(new_connection,
                                new_connection.local_endpoint,
                                new_remote_endpoint)
         new_udp.transport = self.transport
-        print(self.transport)
         if new_connection.connection_received:
-            new_connection.loop.create_task(
-                new_connection.connection_received(new_connection))
-            print_time("Called connection_received cb", color)
+            schedule_callback(new_connection.loop,
+                              new_connection.connection_received,
+                              new_connection)
         new_udp.datagram_received(data, addr)
-        self.remotes[addr] = new_connection
+        self.remotes[addr] = new_udp.datagram_received
+        # The flows share the listening socket, so an evicted flow is not
+        # closed, later datagrams from its peer start a new Connection
+        if len(self.remotes) > UDP_MAX_FLOWS:
+            self.remotes.popitem(last=False)
         return
 
 
 class StreamHandler(asyncio.Protocol):
+    # One handler exists per accepted connection. uvloop binds the protocol
+    # callbacks before connection_made runs, so they stay methods that
+    # forward to the TcpTransport kept in transport
+    __slots__ = ("preconnection", "connection", "transport")
 
     def __init__(self, preconnection):
-        new_connection = Connection(preconnection)
-        self.connection = new_connection
+        self.preconnection = preconnection
+        self.connection = None
+        self.transport = None
 
     def connection_made(self, transport):
-        new_remote_endpoint = RemoteEndpoint()
-        print_time("Received new connection.", color)
+        # asyncio creates a handler for every accepted socket, including
+        # those whose TLS handshake then fails, so only create the
+        # Connection once the connection has actually been made
+        self.connection = Connection(self.preconnection)
         # Get information about the newly connected endpoint
-        new_remote_endpoint.with_address(
-                            transport.get_extra_info("peername")[0])
-        new_remote_endpoint.with_port(
-                            transport.get_extra_info("peername")[1])
+        peer = transport.get_extra_info("peername")
+        logger.debug("Received new connection from %s:%s.", peer[0], peer[1])
+        new_remote_endpoint = RemoteEndpoint()
+        new_remote_endpoint.with_address(peer[0])
+        new_remote_endpoint.with_port(peer[1])
         self.connection.remote_endpoint = new_remote_endpoint
         new_tcp = TcpTransport(self.connection,
                                self.connection.local_endpoint,
                                new_remote_endpoint)
         new_tcp.transport = transport
+        new_tcp.apply_capacity_profile(transport)
+        self.transport = new_tcp
         self.connection.state = ConnectionState.ESTABLISHED
         if self.connection.connection_received:
-            self.connection.loop.create_task(
-                self.connection.connection_received(self.connection)
-            )
+            schedule_callback(self.connection.loop,
+                              self.connection.connection_received,
+                              self.connection)
         return
 
     def eof_received(self):
-        self.connection.transports[0].eof_received()
+        self.transport.eof_received()
 
     def data_received(self, data):
-        self.connection.transports[0].data_received(data)
+        self.transport.data_received(data)
 
     def error_received(self, err):
-        self.connection.transports[0].error_received(err)
+        self.transport.error_received(err)
 
     def connection_lost(self, exc):
-        self.connection.transports[0].connection_lost(exc)
+        self.transport.connection_lost(exc)
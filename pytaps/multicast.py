@@ -34,7 +34,7 @@ def got_packet(listener, size, data, port):
     return 0
 
 
-def do_join(listener):
+def do_join(listener, local=None):
     global _loop, _libhandle
     if _loop is None:
         if listener.loop is None:
@@ -47,7 +47,8 @@ def do_join(listener):
         assert(_libhandle is not None)
 
     remote = listener.remote_endpoint.address[0]
-    local = listener.local_endpoint.address[0]
+    if local is None:
+        local = listener.local_endpoint.address[0]
 
     if _loop is not listener.loop:
         # if we hit this, we need to maintain a dict to keep a separate
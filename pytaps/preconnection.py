@@ -2,13 +2,14 @@ import asyncio
 import ssl
 from .yang_validate import *
 import xml.etree.ElementTree as ET
-from .connection import Connection
+from .connection import Connection, get_ssl_context, pool_key, take_pooled
 from .securityParameters import SecurityParameters
 from .transportProperties import *
 from .endpoint import LocalEndpoint, RemoteEndpoint
 from .utility import *
 from .transports import *
 from .listener import Listener
+from .resolver import cached_getaddrinfo
 color = "red"
 
 
@@ -36,11 +37,16 @@ class Preconnection:
         yangfile (file, optional):
                         File descriptor of a JSON file containing a
                         TAPS YANG configuration
+        reuse_port (boolean, optional):
+                        Whether listeners set SO_REUSEPORT on their
+                        sockets, so several processes can listen on the
+                        same address and port, False by default
     """
     def __init__(self, local_endpoint=None, remote_endpoint=None,
                  transport_properties=TransportProperties(),
                  security_parameters=None,
-                 event_loop=asyncio.get_event_loop()):
+                 event_loop=asyncio.get_event_loop(),
+                 reuse_port=False):
 
         # Initializations from arguments
         self.local_endpoint = local_endpoint
@@ -49,6 +55,7 @@ class Preconnection:
         self.security_parameters = security_parameters
 
         self.loop = event_loop
+        self.reuse_port = reuse_port
 
         # Callbacks of the appliction
         self.read = None
@@ -64,6 +71,8 @@ class Preconnection:
         self.active = False
         # Framer object
         self.framer = None
+        # Client SSL context and the security parameters it was built for
+        self.ssl_context = None
 
     def from_yang(frmat, text, *args, **kwargs):
         self = Preconnection(*args, **kwargs)
@@ -201,11 +210,50 @@ class Preconnection:
         print_time("Initiating connection.", color)
 
         new_connection = Connection(self)
-        # Race the candidate sets
-        self.loop.create_task(new_connection.race())
+        new_connection.security_context = await self.get_ssl_context()
+        # Race the candidate sets, keeping a reference to the task so it
+        # is not garbage collected and can be cancelled on close
+        new_connection.race_task = self.loop.create_task(
+            new_connection.race())
         print_time("Returning connection object.", color)
         return new_connection
 
+    async def initiate_with_pool(self):
+        """ Like initiate, but reuses an idle connection to the same
+            remote endpoint with the same properties if one was handed
+            back with Connection.release. A reused connection issues its
+            ready event right away, without racing or a new handshake.
+        """
+        key = pool_key(self)
+        connection = take_pooled(key)
+        if connection is None:
+            connection = await self.initiate()
+            connection.pool_key = key
+            return connection
+        print_time("Reusing pooled connection.", color)
+        connection.set_callbacks(self)
+        if connection.ready:
+            schedule_callback(self.loop, connection.ready, connection)
+        return connection
+
+    async def get_ssl_context(self):
+        """ Returns the client SSL context for the security parameters of
+            the preconnection, or None if no security parameters were set.
+            The context is shared with all preconnections that use the
+            same identity and trusted CAs. Loading the certificates reads
+            from disk, so it is done in the default executor instead of
+            blocking the event loop.
+        """
+        if not self.security_parameters:
+            return None
+        key = (self.security_parameters.identity,
+               tuple(sorted(self.security_parameters.trustedCA)))
+        if self.ssl_context is None or self.ssl_context[0] != key:
+            context = await self.loop.run_in_executor(
+                None, get_ssl_context, *key)
+            self.ssl_context = (key, context)
+        return self.ssl_context[1]
+
     async def listen(self):
         """ Tries to start a listener, first chooses candidate protcol and
             then tries to establish it with the appropriate asyncio function.
@@ -226,8 +274,9 @@ class Preconnection:
         if self.remote_endpoint is None:
             raise Exception("A remote endpoint needs "
                             "to be specified to resolve")
-        remote_info = await self.loop.getaddrinfo(
-            self.remote_endpoint.host_name, self.remote_endpoint.port)
+        remote_info = await cached_getaddrinfo(
+            self.loop, self.remote_endpoint.host_name,
+            self.remote_endpoint.port)
         self.remote_endpoint.address = remote_info[0][4][0]
 
     # Set the framer
@@ -301,7 +350,7 @@ class Preconnection:
             cb_data = data
             addr = listener.remote_endpoint.address
             if port in listener.active_ports:
-                listener.active_ports[port].transports[0].datagram_received(
+                listener.active_ports[port].transport.datagram_received(
                     cb_data, (addr, port))
             else:
                 rp = RemoteEndpoint()
@@ -321,8 +370,8 @@ class Preconnection:
                 listener.active_ports[port] = conn
                 listener.loop.create_task(new_udp.active_open(None))
                 if self.connection_received:
-                    self.loop.create_task(
-                        self.connection_received(conn))
+                    schedule_callback(self.loop, self.connection_received,
+                                      conn)
                     print_time("Called connection_received cb", color)
         except BaseException as e:
             print(e)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from .utility import positive_number_from_env
+
+# Reuse resolved addresses of a host for PYTAPS_DNS_TTL seconds, 60 s
+# by default
+ADDRINFO_TTL = positive_number_from_env("PYTAPS_DNS_TTL", 60)
+# Maximum number of hosts kept in the address cache
+ADDRINFO_CACHE_SIZE = 256
+
+# Resolved addresses per (host, port), with the time they were resolved
+_addrinfo_cache = {}
+# Lookups that are currently running per (event loop, host, port)
+_addrinfo_inflight = {}
+# Coroutine function used instead of loop.getaddrinfo, if set
+_resolver = None
+
+
+def set_resolver(resolver):
+    """ Sets the resolver used to look up the addresses of remote and
+        local endpoints, e.g. to use an asynchronous DNS library instead of
+        the thread pool behind loop.getaddrinfo.
+
+    Attributes:
+        resolver (coroutine function, required): Called with host and
+                port, has to return a list in the format returned by
+                socket.getaddrinfo. None restores loop.getaddrinfo.
+    """
+    global _resolver
+    _resolver = resolver
+    # Answers of the previous resolver must not outlive it
+    _addrinfo_cache.clear()
+    _addrinfo_inflight.clear()
+
+
+async def cached_getaddrinfo(loop, host, port):
+    """ Resolves host and port like loop.getaddrinfo, but reuses the
+        result of an earlier lookup for up to ADDRINFO_TTL seconds.
+        Concurrent lookups of the same host and port on the same event
+        loop share one query.
+    """
+    entry = _addrinfo_cache.get((host, port))
+    if entry is not None and time.monotonic() - entry[0] < ADDRINFO_TTL:
+        return entry[1]
+    # A task can only be awaited on its own loop, so lookups are shared
+    # per loop
+    key = (loop, host, port)
+    lookup = _addrinfo_inflight.get(key)
+    if lookup is None:
+        # Lookups of loops that were closed while they ran never finish,
+        # forget them instead of keeping their loops alive
+        for stale in [stale for stale in _addrinfo_inflight
+                      if stale[0].is_closed()]:
+            del _addrinfo_inflight[stale]
+        lookup = loop.create_task(_getaddrinfo(loop, host, port))
+        _addrinfo_inflight[key] = lookup
+        lookup.add_done_callback(
+            lambda _: _addrinfo_inflight.pop(key, None))
+    # Cancelling one caller must not cancel the lookup of the others
+    return await asyncio.shield(lookup)
+
+
+async def _getaddrinfo(loop, host, port):
+    """ Looks up host and port and stores the result in the cache.
+    """
+    if _resolver is not None:
+        info = await _resolver(host, port)
+    else:
+        info = await loop.getaddrinfo(host, port)
+    key = (host, port)
+    now = time.monotonic()
+    _addrinfo_cache.pop(key, None)
+    if len(_addrinfo_cache) >= ADDRINFO_CACHE_SIZE:
+        # Drop expired entries, or the oldest one if none has expired
+        for old_key, (resolved, _) in list(_addrinfo_cache.items()):
+            if now - resolved >= ADDRINFO_TTL:
+                del _addrinfo_cache[old_key]
+        if len(_addrinfo_cache) >= ADDRINFO_CACHE_SIZE:
+            del _addrinfo_cache[next(iter(_addrinfo_cache))]
+    _addrinfo_cache[key] = (now, info)
+    return info
@@ -1,4 +1,6 @@
 from enum import Enum
+from operator import itemgetter
+import functools
 import json
 
 
@@ -129,6 +131,89 @@ def get_protocols():
     return protocols
 
 
+# Position of the mask collecting the properties of each preference
+# level in TransportProperties.select_protocols, IGNORE is not
+# collected
+_LEVEL_MASK = {
+    PreferenceLevel.REQUIRE: 0,
+    PreferenceLevel.PROHIBIT: 1,
+    PreferenceLevel.PREFER: 2,
+    PreferenceLevel.AVOID: 3,
+}
+
+# Number of set bits in an integer
+_popcount = getattr(int, "bit_count", lambda mask: bin(mask).count("1"))
+
+
+def _protocol_masks(protocols):
+    """ Encodes the boolean properties of each protocol as bitmasks.
+
+    Returns a dict mapping each property name to its bit and a tuple of
+    (name, mask of properties the protocol has, mask of properties it
+    lacks) tuples. Properties that are optional for a protocol are in
+    neither mask.
+    """
+    prop_bit = {}
+    proto_masks = []
+    for protocol in protocols:
+        has = lacks = 0
+        for prop, value in protocol.items():
+            if prop == "name":
+                continue
+            bit = prop_bit.setdefault(prop, 1 << len(prop_bit))
+            if value is True:
+                has |= bit
+            elif value is False:
+                lacks |= bit
+        proto_masks.append((protocol["name"], has, lacks))
+    return prop_bit, tuple(proto_masks)
+
+
+@functools.lru_cache(maxsize=64)
+def _select_protocols(properties):
+    """ Selects and orders the candidate protocols for a frozenset of
+        (property, preference level) pairs, see
+        TransportProperties.select_protocols. Applications tend to reuse a
+        handful of property sets, so selections are cached across
+        TransportProperties objects until the protocol table is reloaded.
+    """
+    # Collect the properties of each preference level as a bitmask,
+    # the order of the properties does not matter for that
+    masks = [0, 0, 0, 0]
+    for transport_property, level in properties:
+        index = _LEVEL_MASK.get(level)
+        if index is not None:
+            masks[index] |= _PROP_BIT.get(transport_property, 0)
+    require, prohibit, prefer, avoid = masks
+
+    # Remove protocols that have a prohibited property or lack a
+    # required one, count how many PREFER and AVOID properties
+    # each remaining protocol has
+    candidates = [(name, (_popcount(has & prefer), -_popcount(has & avoid)))
+                  for name, has, lacks in _PROTO_MASKS
+                  if not has & prohibit and not lacks & require]
+
+    # Sort candidates by number of PREFERs and then by AVOIDs on ties,
+    # which is the order in which their (prefers, -avoids) scores compare.
+    # The result is shared by all callers, so hand it out immutable
+    candidates.sort(key=itemgetter(1), reverse=True)
+    return tuple(candidates)
+
+
+def reload_protocols():
+    """ Reads the table of available protocols again and rebuilds the
+        bitmasks used for candidate selection. The table is parsed once
+        at import, so this is only needed if it changes at runtime.
+    """
+    global _AVAILABLE_PROTOCOLS, _PROP_BIT, _PROTO_MASKS
+    _AVAILABLE_PROTOCOLS = tuple(get_protocols())
+    _PROP_BIT, _PROTO_MASKS = _protocol_masks(_AVAILABLE_PROTOCOLS)
+    _select_protocols.cache_clear()
+
+
+reload_protocols()
+
+
 class TransportProperties:
     """ Class to handle the TAPS transport properties.
 
@@ -147,7 +232,8 @@ class TransportProperties:
             "multipath": PreferenceLevel.PREFER,
             "direction": "bidirectional",
             "retransmit-notify": PreferenceLevel.IGNORE,
-            "soft-error-notify": PreferenceLevel.IGNORE
+            "soft-error-notify": PreferenceLevel.IGNORE,
+            "capacity-profile": "default"
         }
 
     def add(self, prop, value):
@@ -224,6 +310,14 @@ class TransportProperties:
             "multipath": PreferenceLevel.PREFER,
             "direction": "Bidirectional",
             "retransmit-notify": PreferenceLevel.IGNORE,
-            "soft-error-notify": PreferenceLevel.IGNORE
+            "soft-error-notify": PreferenceLevel.IGNORE,
+            "capacity-profile": "default"
         }
         self.properties[prop] = defaults.get(prop)
+
+    def select_protocols(self):
+        """ Returns the protocols that satisfy these properties as a tuple
+            of (name, (number of PREFERs, -number of AVOIDs)) tuples,
+            ordered according to the TAPS interface draft.
+        """
+        return _select_protocols(frozenset(self.properties.items()))
@@ -1,12 +1,16 @@
 import asyncio
 import json
+import logging
+import socket
 import sys
 import ssl
+from collections import deque
 from .endpoint import LocalEndpoint, RemoteEndpoint
 from .transportProperties import *
 from .utility import *
 from .framer import *
 color = "white"
+logger = logging.getLogger(__name__)
 
 
 class MessageContext(object):
@@ -25,15 +29,25 @@ class TransportLayer(asyncio.Protocol):
                         LocalEndpoint
         remote_endpoint (RemoteEndpoint, optional):
                         RemoteEndpoint
+        remote_address (string, optional):
+                        Remote address this transport connects to
+        local_address (string, optional):
+                        Local address this transport is bound to
     """
-    def __init__(self, connection, local_endpoint=None, remote_endpoint=None):
+    def __init__(self, connection, local_endpoint=None, remote_endpoint=None,
+                 remote_address=None, local_address=None):
         self.local_endpoint = local_endpoint
         self.remote_endpoint = remote_endpoint
+        self.remote_address = remote_address
+        self.local_address = local_address
         self.connection = connection
         self.loop = connection.loop
-        self.connection.transports.append(self)
-        self.waiters = []
-        self.open_receives = 0
+        # Passive connections are established on their first transport,
+        # active ones get the transport that wins the race
+        if not connection.active:
+            connection.transport = self
+        # Futures of reads waiting for new data, oldest first
+        self.waiters = deque()
         # Keeping track of how many messages have been sent for msgref
         self.message_count = 0
         # Determines if the protocol is message based or not (needed?)
@@ -42,76 +56,109 @@ class TransportLayer(asyncio.Protocol):
         self.recv_buffer = None
         # Boolean to indicate that EOF has been reached
         self.at_eof = False
+        # Bound methods and framer looked up on every packet
+        self._create_task = self.loop.create_task
+        self._create_future = self.loop.create_future
+        self._framer = connection.framer
 
         # If we have a framer, create a buffer for deframed messages
         if connection.framer:
-            self.active_framer = None
             self.framer_buffer = []
+            # Set whenever new data is waiting to be deframed
+            self.data_event = asyncio.Event()
+            # Task running the deframer, started on the first data
+            self.deframer = None
+            # Set once the connection is lost, the deframer then ends
+            # after deframing the data received so far
+            self.input_closed = False
     """ Function that blocks until new data has arrived
     """
     async def await_data(self):
-        waiter = self.loop.create_future()
+        waiter = self._create_future()
         self.waiters.append(waiter)
         try:
             await waiter
         finally:
-            del self.waiters[0]
+            # The waiter has already been removed if it was woken up
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def wake_waiter(self):
+        """ Wakes the oldest read that is still waiting for data.
+            Returns True if a read was woken.
+        """
+        while self.waiters:
+            w = self.waiters.popleft()
+            if not w.done():
+                w.set_result(None)
+                return True
+        return False
 
-    """ Function that blocks until a framer has finished deframing
+    """ Long-lived task that deframes the recv_buffer whenever
+        new data has arrived
     """
-    async def await_framer(self):
-        self.active_framer = self.loop.create_future()
-        try:
-            await self.active_framer
-        finally:
-            self.active_framer = None
+    async def run_deframer(self):
+        while True:
+            await self.data_event.wait()
+            self.data_event.clear()
+            await self.invoke_framer()
+            if self.input_closed:
+                return
+
+    def stop_deframer(self):
+        """ Lets the deframer task deframe the data received so far and
+            then end, called once no more data can arrive.
+        """
+        if self._framer and self.deframer is not None:
+            self.input_closed = True
+            self.data_event.set()
 
-    """ Invokes the framer to deframe newly arrived data
+    """ Invokes the framer to deframe as many messages as possible
+        from the recv_buffer
     """
     async def invoke_framer(self):
-        # If there is already another deframing in progress,
-        #  wait for it to complete
-        if self.active_framer:
-            await self.active_framer
-        self.active_framer = self.loop.create_future()
-        # Try to call the deframing function implemented
-        # by the individual framer
-        try:
-            ctx, msg, len, eom = await \
-                self.connection.framer.handle_received_data(self.connection)
-        except (DeframingFailed, ValueError, TypeError):
-            # If the framer throws an DeframingFailed Error, stop trying
-            # to deframe until new data arrives
-            self.active_framer.set_result(None)
-            self.active_framer = None
-            return
-        # If a message was deframed succesful, modify the recv buffer,
-        #  add the message to the framer buffer
-        self.recv_buffer = self.recv_buffer[len:]
-        self.framer_buffer.append(msg)
-        self.active_framer.set_result(None)
-        self.active_framer = None
-        for w in self.waiters:
-            if not w.done():
-                w.set_result(None)
+        while self.recv_buffer:
+            # Try to call the deframing function implemented
+            # by the individual framer
+            try:
+                ctx, msg, len, eom = await \
+                    self._framer.handle_received_data(self.connection)
+            except (DeframingFailed, ValueError, TypeError):
+                # If the framer throws an DeframingFailed Error, stop trying
+                # to deframe until new data arrives
+                return
+            # A framer that consumes nothing would be called again with
+            # the same data forever, wait for more data instead
+            if len is None or len <= 0:
                 return
-        # Since there might be another message that is able to be deframed,
-        #  invoke the framer again
-        self.loop.create_task(self.invoke_framer())
+            # If a message was deframed succesful, modify the recv buffer,
+            #  add the message to the framer buffer
+            self.advance_receive_cursor(len)
+            self.framer_buffer.append(msg)
+            self.wake_waiter()
+
+    def advance_receive_cursor(self, length):
+        """ Removes length bytes of deframed data from the recv_buffer
+        """
+        del self.recv_buffer[:length]
 
     def send(self, data):
-        """ Function responsible for sending data.
+        """ Function responsible for sending data. Bytes-like data is
+            passed on as is, strings are encoded once here.
         """
         self.message_count += 1
         if self.connection.state is not ConnectionState.ESTABLISHED:
             print_time("SendError occured, connection is not established.",
                        color)
-            if self.send_error:
-                self.loop.create_task(
-                    self.send_error(message_count, self.connection)
-                    )
+            if self.connection.send_error:
+                schedule_callback(self.loop, self.connection.send_error,
+                                  self.message_count, self.connection)
             return
-        self.loop.create_task(self.write(data))
+        if isinstance(data, str):
+            data = data.encode()
+        self._create_task(self.write(data))
         return self.message_count
 
     async def write(self):
@@ -122,8 +169,7 @@ class TransportLayer(asyncio.Protocol):
             self.loop.create_task(self.read_framed(min_incomplete_length,
                                   max_length))
         else:"""
-        self.loop.create_task(self.read(min_incomplete_length,
-                                        max_length))
+        self._create_task(self.read(min_incomplete_length, max_length))
 
     async def read(self):
         pass
@@ -137,21 +183,22 @@ class UdpTransport(TransportLayer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.context = MessageContext()
+        # Queue of received datagrams, oldest first
+        self.recv_buffer = deque()
 
     async def active_open(self, transport):
         # If there is a framer, call the start event
         if self.connection.framer is not None:
             await self.connection.framer.handle_start(self.connection)
         self.transport = transport
-        for t in self.connection.pending:
-            t.cancel()
         print_time("Connected successfully UDP to " +
                    str(self.connection.remote_endpoint.address) +
                    ":" + str(self.connection.remote_endpoint.port) +
                    ".", color)
         self.connection.state = ConnectionState.ESTABLISHED
         if self.connection.ready:
-            self.loop.create_task(self.connection.ready(self.connection))
+            schedule_callback(self.loop, self.connection.ready,
+                              self.connection)
         return
 
     async def passive_open(self, transport):
@@ -159,34 +206,37 @@ class UdpTransport(TransportLayer):
         if self.connection.framer is not None:
             await self.connection.framer.handle_start(self.connection)
         self.transport = transport
-        new_remote_endpoint = RemoteEndpoint()
         print_time("Received new connection.", color)
         # Get information about the newly connected endpoint
-        new_remote_endpoint.with_address(
-                            transport.get_extra_info("peername")[0])
-        new_remote_endpoint.with_port(
-                            transport.get_extra_info("peername")[1])
+        peer = transport.get_extra_info("peername")
+        new_remote_endpoint = RemoteEndpoint()
+        new_remote_endpoint.with_address(peer[0])
+        new_remote_endpoint.with_port(peer[1])
         self.remote_endpoint = new_remote_endpoint
         self.connection.state = ConnectionState.ESTABLISHED
         if self.connection.connection_received:
-            self.loop.create_task(self.connection_received(self))
+            schedule_callback(self.loop, self.connection.connection_received,
+                              self.connection)
         return
 
+    def advance_receive_cursor(self, length):
+        """ Removes the deframed datagram from the recv_buffer
+        """
+        self.recv_buffer.popleft()
+
     async def write(self, data):
         """ Sends udp data
         """
-        print_time("Writing UDP data to " +
-                   str(self.connection.remote_endpoint.address[0]) +
-                   ":" + str(self.connection.remote_endpoint.port) +
-                   ".", color)
-        if isinstance(data, str):
-            data = data.encode()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Writing UDP data to %s:%s.",
+                         self.connection.remote_endpoint.address,
+                         self.connection.remote_endpoint.port)
         try:
             # See if the udp flow was the result of passive or active open
             if self.connection.active:
                 # Frame the data
-                if self.connection.framer:
-                    data = await self.connection.framer.\
+                if self._framer:
+                    data = await self._framer.\
                         handle_new_sent_message(data, None, False)
                 # Write the data
                 self.transport.sendto(data)
@@ -197,25 +247,27 @@ class UdpTransport(TransportLayer):
         except Exception:
             print_time("SendError occured.", color)
             if self.connection.send_error:
-                self.loop.create_task(
-                    self.connection.send_error(
-                        self.message_count, self.connection
-                    )
-                )
+                schedule_callback(self.loop, self.connection.send_error,
+                                  self.message_count, self.connection)
             return
-        print_time("Data written successfully.", color)
-        if self.connection.sent:
-            self.loop.create_task(
-                self.connection.sent(self.message_count, self.connection)
-            )
+        logger.debug("Data written successfully.")
+        # The sent callback is usually set once the connection is ready,
+        # so it is looked up per message rather than cached
+        sent = self.connection.sent
+        if sent:
+            schedule_callback(self.loop, sent, self.message_count,
+                              self.connection)
         return
 
     async def close(self):
         print_time("Closing connection.", color)
+        if self._framer and self.deframer:
+            self.deframer.cancel()
         self.transport.close()
         self.connection.state = ConnectionState.CLOSED
         if self.connection.closed:
-            self.loop.create_task(self.connection.closed(self.connection))
+            schedule_callback(self.loop, self.connection.closed,
+                              self.connection)
 
     async def read(self, min_incomplete_length, max_length):
         if self.connection.framer:
@@ -223,16 +275,12 @@ class UdpTransport(TransportLayer):
                 await self.await_data()
             data = self.framer_buffer.pop(0)
         else:
-            if self.recv_buffer is None:
+            while not self.recv_buffer:
                 await self.await_data()
-            if len(self.recv_buffer) == 1:
-                data = self.recv_buffer[0]
-                self.recv_buffer = None
-            else:
-                data = self.recv_buffer.pop(0)
+            data = self.recv_buffer.popleft()
         if self.connection.received:
-            self.loop.create_task(self.connection.received(data,
-                                  self.context, self.connection))
+            schedule_callback(self.loop, self.connection.received,
+                              data, self.context, self.connection)
 
     # Asyncio Callbacks
 
@@ -244,23 +292,10 @@ class UdpTransport(TransportLayer):
             transport.close()
             return
 
-        # Check if its an incoming or outgoing connection
-        if self.connection.active:
-            self.loop.create_task(self.active_open(transport))
-        else:
-            self.loop.create_task(self.passive_open(transport))
-            # Stub code for forcfully killing connection tasks
-            # Before establishment to the peer has been completed
-            """
-            for t in self.connection.transports:
-                if t != self:
-                    self.connection.transports.remove(t)
-
-            for t in self.connection.pending.keys():
-                if self.connection.pending[t] != self:
-                    print(self.connection.pending[t])
-                    print(t)
-                    t.cancel()"""
+        # Check if its an incoming or outgoing connection. Outgoing
+        # connections are opened by the winner of Connection.race
+        if not self.connection.active:
+            self._create_task(self.passive_open(transport))
 
     """ ASYNCIO function that gets called when EOF is received
     """
@@ -271,18 +306,14 @@ class UdpTransport(TransportLayer):
         is received. It stores the datagram in the recv_buffer
     """
     def datagram_received(self, data, addr):
-        if self.recv_buffer is None:
-            self.recv_buffer = list()
         self.recv_buffer.append(data)
 
-        if self.connection.framer:
-            self.loop.create_task(self.invoke_framer())
-            return
+        if self._framer:
+            if self.deframer is None:
+                self.deframer = self._create_task(self.run_deframer())
+            self.data_event.set()
         else:
-            for w in self.waiters:
-                if not w.done():
-                    w.set_result(None)
-                    return
+            self.wake_waiter()
 
     """ ASYNCIO function that gets called when the connection has
         an error.
@@ -293,25 +324,25 @@ class UdpTransport(TransportLayer):
             print_time("Connection Error occured.", color)
             print(err)
             if self.connection.connection_error:
-                self.loop.create_task(
-                    self.connection.connection_error(err, self.connection)
-                )
+                schedule_callback(self.loop, self.connection.connection_error,
+                                  err, self.connection)
             return
 
     """ ASNYCIO function that gets called when the connection
         is lost
     """
     def connection_lost(self, exc):
+        self.stop_deframer()
         if exc is None:
             print_time("Connection lost without err", color)
             if self.connection.closed:
-                self.loop.create_task(self.connection.closed(self.connection))
+                schedule_callback(self.loop, self.connection.closed,
+                                  self.connection)
         else:
             print_time("Connection lost with err", color)
             if self.connection.connection_error:
-                self.loop.create_task(
-                    self.connection.connection_error(exc, self.connection)
-                )
+                schedule_callback(self.loop, self.connection.connection_error,
+                                  exc, self.connection)
 
 
 class TcpTransport(TransportLayer):
@@ -319,17 +350,23 @@ class TcpTransport(TransportLayer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.context = MessageContext()
+        # Byte stream received so far, extended in place on new data
+        self.recv_buffer = bytearray()
 
     async def active_open(self, transport):
         # If there is a framer, call the start event
         if self.connection.framer is not None:
             await self.connection.framer.handle_start(self.connection)
         self.transport = transport
+        # Keep the TLS session so the next connection can resume it
+        if self.connection.security_context:
+            self.connection.security_context.remember_session(
+                transport.get_extra_info("ssl_object"))
         print_time("Connected successfully on TCP.", color)
         self.connection.state = ConnectionState.ESTABLISHED
-        self.connection.sleeper_for_racing.cancel_all()
         if self.connection.ready:
-            self.loop.create_task(self.connection.ready(self.connection))
+            schedule_callback(self.loop, self.connection.ready,
+                              self.connection)
         return
 
     async def passive_open(self, transport):
@@ -337,46 +374,68 @@ class TcpTransport(TransportLayer):
         if self.connection.framer is not None:
             await self.connection.framer.handle_start(self.connection)
         self.transport = transport
-        new_remote_endpoint = RemoteEndpoint()
         print_time("Received new connection.", color)
         # Get information about the newly connected endpoint
-        new_remote_endpoint.with_address(
-                            transport.get_extra_info("peername")[0])
-        new_remote_endpoint.with_port(
-                            transport.get_extra_info("peername")[1])
+        peer = transport.get_extra_info("peername")
+        new_remote_endpoint = RemoteEndpoint()
+        new_remote_endpoint.with_address(peer[0])
+        new_remote_endpoint.with_port(peer[1])
         self.remote_endpoint = new_remote_endpoint
         self.connection.state = ConnectionState.ESTABLISHED
         if self.connection.connection_received:
-            self.loop.create_task(self.connection_received(self))
+            schedule_callback(self.loop, self.connection.connection_received,
+                              self.connection)
         return
 
-    async def write(self, data):
-        """ Send tcp data
+    def send(self, data):
+        """ Without a framer, writing to the asyncio transport does not
+            block, so data is written right away instead of from a task.
         """
-        print_time("Writing TCP data.", color)
+        if (self._framer or
+                self.connection.state is not ConnectionState.ESTABLISHED):
+            return super().send(data)
+        self.message_count += 1
         if isinstance(data, str):
             data = data.encode()
-        try:
+        self.write_data(data)
+        return self.message_count
 
-            # Frame the data
-            if self.connection.framer:
-                data = await self.connection.framer.\
+    async def write(self, data):
+        """ Frames and sends tcp data
+        """
+        # Frame the data
+        if self._framer:
+            try:
+                data = await self._framer.\
                     handle_new_sent_message(data, None, False)
+            except Exception:
+                print_time("SendError occured.", color)
+                if self.connection.send_error:
+                    schedule_callback(self.loop, self.connection.send_error,
+                                      self.message_count, self.connection)
+                return
+        self.write_data(data)
+
+    def write_data(self, data):
+        """ Writes tcp data to the transport and issues the sent event
+        """
+        logger.debug("Writing TCP data.")
+        try:
             # Attempt to write data
             self.transport.write(data)
         except Exception:
             print_time("SendError occured.", color)
-            if self.send_error:
-                self.loop.create_task(
-                    self.send_error(self.message_count, self.connection)
-                )
+            if self.connection.send_error:
+                schedule_callback(self.loop, self.connection.send_error,
+                                  self.message_count, self.connection)
             return
-        print_time("Data written successfully.", color)
-        if self.connection.sent:
-            self.loop.create_task(
-                self.connection.sent(self.message_count, self.connection)
-            )
-        return
+        logger.debug("Data written successfully.")
+        # The sent callback is usually set once the connection is ready,
+        # so it is looked up per message rather than cached
+        sent = self.connection.sent
+        if sent:
+            schedule_callback(self.loop, sent, self.message_count,
+                              self.connection)
 
     async def read(self, min_incomplete_length, max_length):
         # print_time("Reading message", color)
@@ -385,37 +444,47 @@ class TcpTransport(TransportLayer):
                 await self.await_data()
             data = self.framer_buffer.pop(0)
             if self.connection.received:
-                self.loop.create_task(
-                    self.connection.received(data, "Context", self.connection)
-                )
+                schedule_callback(self.loop, self.connection.received,
+                                  data, "Context", self.connection)
             return
 
-        while self.recv_buffer is None or (
+        while not self.recv_buffer or (
                 len(self.recv_buffer) < min_incomplete_length):
             await self.await_data()
         if max_length == -1 or len(self.recv_buffer) <= max_length:
-            data = self.recv_buffer
-            self.recv_buffer = None
-        elif len(self.recv_buffer) > max_length:
-            data = self.recv_buffer[:max_length]
-            self.recv_buffer = self.recv_buffer[max_length:]
+            data = bytes(self.recv_buffer)
+            self.recv_buffer = bytearray()
+        else:
+            # Copy the returned part straight out of the buffer, the view
+            # has to be released before the buffer can be resized
+            with memoryview(self.recv_buffer) as view:
+                data = bytes(view[:max_length])
+            del self.recv_buffer[:max_length]
 
         if self.at_eof:
             if self.connection.received:
-                self.loop.create_task(self.connection.received(data,
-                                      self.context, self.connection))
+                schedule_callback(self.loop, self.connection.received,
+                                  data, self.context, self.connection)
             return
         else:
             if self.connection.received_partial:
-                self.loop.create_task(self.connection.received_partial(data,
-                                      self.context, False, self))
+                schedule_callback(self.loop, self.connection.received_partial,
+                                  data, self.context, False, self)
 
     async def close(self):
         print_time("Closing connection.", color)
+        if self._framer and self.deframer:
+            self.deframer.cancel()
+        # TLS 1.3 session tickets arrive after the handshake,
+        # so store the session again before closing
+        if self.connection.active and self.connection.security_context:
+            self.connection.security_context.remember_session(
+                self.transport.get_extra_info("ssl_object"))
         self.transport.close()
         self.connection.state = ConnectionState.CLOSED
         if self.connection.closed:
-            self.loop.create_task(self.connection.closed(self.connection))
+            schedule_callback(self.loop, self.connection.closed,
+                              self.connection)
 
 # Asyncio Callbacks
 
@@ -427,24 +496,33 @@ class TcpTransport(TransportLayer):
             transport.close()
             return
 
-        # Check if its an incoming or outgoing connection
-        if self.connection.active:
-            self.loop.create_task(self.active_open(transport))
-        else:
-            self.loop.create_task(self.passive_open(transport))
+        # Check if its an incoming or outgoing connection. Outgoing
+        # connections are opened by the winner of Connection.race
+        if not self.connection.active:
+            self._create_task(self.passive_open(transport))
+        self.apply_capacity_profile(transport)
 
-            # Stub code for forcfully killing connection tasks
-            # Before establishment to the peer has been completed
-            """
-            for t in self.connection.transports:
-                if t != self:
-                    self.connection.transports.remove(t)
+    def apply_capacity_profile(self, transport):
+        """ Tunes the socket according to the capacity profile
+            transport property of the connection.
 
-            for t in self.connection.pending:
-                if t != asyncio.current_task() and not t.done():
-                    print(t)
-                    print(asyncio.current_task())
-                    t.cancel() """
+            Capacity-seeking connections keep the kernel's receive buffer
+            autotuning, which setting SO_RCVBUF on a connected socket
+            would turn off and cap the window at the requested size.
+        """
+        sock = transport.get_extra_info("socket")
+        if sock is None:
+            return
+        profile = self.connection.transport_properties.properties.get(
+            "capacity-profile", "default")
+        try:
+            if profile.startswith("low-latency"):
+                # A no-op with asyncio, which already disables Nagle on
+                # TCP sockets, kept for event loops that do not
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as err:
+            print_time("Could not apply capacity profile: " + str(err),
+                       color)
 
     """ ASYNCIO function that gets called when EOF is received
     """
@@ -455,21 +533,15 @@ class TcpTransport(TransportLayer):
         by the OS. Stores new data in buffer and triggers the receive waiter
     """
     def data_received(self, data):
-        print_time("Received %d bytes" % len(data), color)
+        logger.debug("Received %d bytes", len(data))
 
-        # See if we already have so data buffered
-        if self.recv_buffer is None:
-            self.recv_buffer = data
-        else:
-            self.recv_buffer = self.recv_buffer + data
-        if self.connection.framer:
-            self.loop.create_task(self.invoke_framer())
-            return
+        self.recv_buffer.extend(data)
+        if self._framer:
+            if self.deframer is None:
+                self.deframer = self._create_task(self.run_deframer())
+            self.data_event.set()
         else:
-            for w in self.waiters:
-                if not w.done():
-                    w.set_result(None)
-                    return
+            self.wake_waiter()
 
     """ ASYNCIO function that gets called when the connection has
         an error.
@@ -479,22 +551,22 @@ class TcpTransport(TransportLayer):
         if type(err) is ConnectionRefusedError:
             print_time("Connection Error occured.", color)
             if self.connection.connection_error:
-                self.loop.create_task(
-                    self.connection.connection_error(err, self.connection)
-                )
+                schedule_callback(self.loop, self.connection.connection_error,
+                                  err, self.connection)
             return
 
     """ ASNYCIO function that gets called when the connection
         is lost
     """
     def connection_lost(self, exc):
+        self.stop_deframer()
         if exc is None:
             print_time("Connection lost without err", color)
             if self.connection.closed:
-                self.loop.create_task(self.connection.closed(self.connection))
+                schedule_callback(self.loop, self.connection.closed,
+                                  self.connection)
         else:
             print_time("Connection lost with err", color)
             if self.connection.connection_error:
-                self.loop.create_task(
-                    self.connection.connection_error(exc, self.connection)
-                )
+                schedule_callback(self.loop, self.connection.connection_error,
+                                  exc, self.connection)
@@ -1,9 +1,23 @@
 import asyncio
 import datetime
 import asyncio
+import inspect
+import logging
+import netifaces
+import os
+import socket
+import time
 from enum import Enum
 from termcolor import colored
 
+logger = logging.getLogger(__name__)
+
+# Reuse the addresses of a local interface for 5 s
+IFACE_ADDRS_TTL = 5
+
+# Addresses per local interface, with the time they were read
+_iface_addrs_cache = {}
+
 
 class ConnectionState(Enum):
     ESTABLISHING = 0
@@ -16,23 +30,83 @@ def print_time(msg="", color="red"):
     print(colored(str(datetime.datetime.now())+": "+msg, color))
 
 
-# Define our own sleep function which keeps track of its running calls
-# so we can cancel them once the Connection is established
-# https://stackoverflow.com/questions/37209864/interrupt-all-asyncio-sleep-currently-executing
-class SleepClassForRacing:
-    tasks = set()
-
-    async def sleep(self, delay, result=None, *, loop=None):
-        coro = asyncio.sleep(delay, result=result, loop=loop)
-        task = asyncio.ensure_future(coro)
-        self.tasks.add(task)
-        try:
-            return await task
-        except asyncio.CancelledError:
-            return result
-        finally:
-            self.tasks.remove(task)
-
-    def cancel_all(self):
-        for task in self.tasks:
-            task.cancel()
+def schedule_callback(loop, callback, *args):
+    """ Issues an event by scheduling the application callback on loop.
+        Coroutine functions are run as a task, other callables are called
+        on the next loop iteration without allocating a task. If such a
+        callable returns an awaitable, e.g. a lambda or functools.partial
+        wrapping a coroutine function, that is then run as a task.
+    """
+    if asyncio.iscoroutinefunction(callback):
+        return loop.create_task(callback(*args))
+    loop.call_soon(_run_callback, loop, callback, args)
+
+
+def _run_callback(loop, callback, args):
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        asyncio.ensure_future(result, loop=loop)
+
+
+def is_multicast_address(address):
+    """ Returns True if address is an IPv4 (224.0.0.0/4) or IPv6 (ff00::/8)
+        multicast address. Raises OSError if it is not an IP address.
+    """
+    if ":" in address:
+        packed = socket.inet_pton(socket.AF_INET6, address.partition("%")[0])
+        return packed[0] == 0xFF
+    return socket.inet_pton(socket.AF_INET, address)[0] & 0xF0 == 0xE0
+
+
+def is_ip_literal(host):
+    """ Returns True if host is an IPv4 or IPv6 address rather than a
+        name that needs to be resolved.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    try:
+        socket.inet_pton(family, host.partition("%")[0])
+    except OSError:
+        return False
+    return True
+
+
+def iface_addrs(interface):
+    """ Returns the usable IPv6 and IPv4 addresses of a local interface,
+        reusing the result of an earlier call for up to IFACE_ADDRS_TTL
+        seconds. Raises ValueError if the interface does not exist.
+    """
+    entry = _iface_addrs_cache.get(interface)
+    now = time.monotonic()
+    if entry is not None and now - entry[0] < IFACE_ADDRS_TTL:
+        return entry[1]
+    addresses = netifaces.ifaddresses(interface)
+    # Unfortunately, link-local IPv6 addresses don't work
+    # because they're broken in
+    # asyncio: https://bugs.python.org/issue35545
+    local_v6_addrs = [entry['addr']
+                      for entry in addresses.get(netifaces.AF_INET6, [])
+                      if not entry['addr'].startswith("fe80")]
+    local_v4_addrs = [entry['addr']
+                      for entry in addresses.get(netifaces.AF_INET, [])]
+    _iface_addrs_cache[interface] = (now, (local_v6_addrs, local_v4_addrs))
+    return local_v6_addrs, local_v4_addrs
+
+
+def positive_number_from_env(name, default, convert=float):
+    """ Returns the number set in the environment variable name, converted
+        with convert. Falls back to default, with a warning, if the
+        variable is not a positive number, and silently if it is unset.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = convert(value)
+    except ValueError:
+        number = None
+    # Also rejects NaN, which compares False against anything
+    if number is None or not number > 0:
+        logger.warning("Ignoring %s=%r, not a positive number, using %s",
+                       name, value, default)
+        return default
+    return number
@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+import socket
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import listener as taps_listener  # noqa: E402
+from pytaps import transports as taps_transports  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_preconnection(loop, port, remote_endpoint=None, reliable=True):
+    lp = taps.LocalEndpoint()
+    lp.with_address("127.0.0.1")
+    lp.with_port(port)
+    tp = taps.TransportProperties()
+    tp.ignore("congestion-control")
+    tp.ignore("preserve-order")
+    if not reliable:
+        tp.prohibit("reliability")
+    return taps.Preconnection(local_endpoint=lp,
+                              remote_endpoint=remote_endpoint,
+                              transport_properties=tp,
+                              event_loop=loop)
+
+
+# A remote endpoint with only a port does not break starting the listener
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_listen_remote_endpoint_without_host_name():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            rp = taps.RemoteEndpoint()
+            rp.with_port(1234)
+            port = free_port()
+            preconnection = make_preconnection(loop, port, rp)
+            errors = []
+            preconnection.on_listen_error(lambda: errors.append(True))
+            await taps.Listener(preconnection).start_listener()
+            assert not errors
+            assert rp.address
+            # The listener accepts connections
+            reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                           port)
+            writer.close()
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
+
+
+# Datagrams from more than UDP_MAX_FLOWS peers forget the least recently
+# active flow, later datagrams from it start a new Connection
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_udp_flows_evict_least_recent(monkeypatch):
+    monkeypatch.setattr(taps_listener, "UDP_MAX_FLOWS", 2)
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            preconnection = make_preconnection(loop, 0, reliable=False)
+            received = []
+            preconnection.on_connection_received(
+                lambda connection: received.append(connection))
+            transport, handler = await loop.create_datagram_endpoint(
+                lambda: taps_listener.DatagramHandler(preconnection),
+                local_addr=("127.0.0.1", 0))
+            first, second, third = [("192.0.2.1", port)
+                                    for port in (1001, 1002, 1003)]
+            for addr in (first, second, first, third):
+                handler.datagram_received(b"data", addr)
+            assert list(handler.remotes) == [first, third]
+            handler.datagram_received(b"data", second)
+            assert list(handler.remotes) == [third, second]
+            await asyncio.sleep(0)
+            assert [connection.remote_endpoint.port
+                    for connection in received] == [1001, 1002, 1003, 1002]
+            transport.close()
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
+
+
+# Accepted TCP connections carry the address and port of their peer
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_stream_connection_remote_endpoint():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            port = free_port()
+            preconnection = make_preconnection(loop, port)
+            received = loop.create_future()
+            preconnection.on_connection_received(received.set_result)
+            await taps.Listener(preconnection).start_listener()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            connection = await received
+            client = writer.get_extra_info("sockname")
+            assert connection.remote_endpoint.address == [client[0]]
+            assert connection.remote_endpoint.port == client[1]
+            writer.close()
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
+
+
+# passive_open records the peer of the transport as the remote endpoint
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_passive_open_remote_endpoint():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            server = await asyncio.start_server(lambda r, w: None,
+                                                "127.0.0.1", 0)
+            server_port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                           server_port)
+            preconnection = make_preconnection(loop, free_port())
+            connection = taps.Connection(preconnection)
+            tcp = taps_transports.TcpTransport(connection,
+                                               connection.local_endpoint,
+                                               taps.RemoteEndpoint())
+            await tcp.passive_open(writer.transport)
+            assert tcp.remote_endpoint.address == ["127.0.0.1"]
+            assert tcp.remote_endpoint.port == server_port
+            assert connection.state is taps.ConnectionState.ESTABLISHED
+            writer.close()
+            server.close()
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
+
+
+def uvloop_new_event_loop():
+    uvloop = pytest.importorskip("uvloop")
+    return uvloop.new_event_loop()
+
+
+# Accepted TCP connections deliver the data their peer sends, also on
+# uvloop, which binds the protocol callbacks before connection_made
+@pytest.mark.timeout(TEST_TIMEOUT)
+@pytest.mark.parametrize("new_event_loop", [asyncio.new_event_loop,
+                                            uvloop_new_event_loop])
+def test_stream_connection_receives_data(new_event_loop):
+    loop = new_event_loop()
+    try:
+        async def test():
+            port = free_port()
+            preconnection = make_preconnection(loop, port)
+            received = loop.create_future()
+
+            async def connection_received(connection):
+                connection.on_received_partial(
+                    lambda data, context, eom, transport:
+                    received.set_result(data))
+                await connection.receive(min_incomplete_length=5)
+            preconnection.on_connection_received(connection_received)
+            await taps.Listener(preconnection).start_listener()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"hello")
+            assert await received == b"hello"
+            writer.close()
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
@@ -0,0 +1,174 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import connection as taps_connection  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+async def start_server(writers=None):
+    """ Starts a TCP server on an ephemeral local port that keeps its
+        connections open, returns it together with its port. The server
+        side writers of accepted connections are appended to writers.
+    """
+    async def keep_open(reader, writer):
+        if writers is not None:
+            writers.append(writer)
+        await reader.read()
+        writer.close()
+    server = await asyncio.start_server(keep_open, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def pooled_connection(port):
+    """ Initiates a connection with initiate_with_pool and returns it
+        once it is ready.
+    """
+    loop = asyncio.get_running_loop()
+    ep = taps.RemoteEndpoint()
+    ep.with_address("127.0.0.1")
+    ep.with_port(port)
+    tp = taps.TransportProperties()
+    tp.ignore("congestion-control")
+    tp.ignore("preserve-order")
+    preconnection = taps.Preconnection(remote_endpoint=ep,
+                                       transport_properties=tp,
+                                       event_loop=loop)
+    ready = loop.create_future()
+    preconnection.on_ready(lambda connection: ready.set_result(connection))
+    await preconnection.initiate_with_pool()
+    return await asyncio.wait_for(ready, TEST_TIMEOUT)
+
+
+def run(test):
+    taps_connection._connection_pool.clear()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        taps_connection._connection_pool.clear()
+        loop.close()
+
+
+def pooled():
+    return [connection for idle in taps_connection._connection_pool.values()
+            for connection in idle]
+
+
+# A released connection is handed out again
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_release_reuses_connection():
+    async def test():
+        server, port = await start_server()
+        first = await pooled_connection(port)
+        first.release()
+        assert pooled() == [first]
+        second = await pooled_connection(port)
+        assert second is first
+        assert pooled() == []
+        assert not taps_connection._connection_pool
+        second.close()
+        server.close()
+    run(test)
+
+
+# Connections with unread data are closed instead of pooled
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_release_with_unread_data_closes():
+    async def test():
+        server, port = await start_server()
+        connection = await pooled_connection(port)
+        connection.transport.recv_buffer += b"stale"
+        connection.release()
+        assert pooled() == []
+        assert connection.state is taps.ConnectionState.CLOSING
+        server.close()
+    run(test)
+
+
+# Idle connections are closed and removed after POOL_IDLE_TIMEOUT
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_idle_timeout_closes(monkeypatch):
+    monkeypatch.setattr(taps_connection, "POOL_IDLE_TIMEOUT", 0.05)
+
+    async def test():
+        server, port = await start_server()
+        connection = await pooled_connection(port)
+        connection.release()
+        assert pooled() == [connection]
+        await asyncio.sleep(0.2)
+        assert not taps_connection._connection_pool
+        assert connection.state is not taps.ConnectionState.ESTABLISHED
+        server.close()
+    run(test)
+
+
+# Releasing more than POOL_SIZE connections closes the oldest
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_pool_size_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(taps_connection, "POOL_SIZE", 1)
+
+    async def test():
+        server, port = await start_server()
+        first = await pooled_connection(port)
+        second = await pooled_connection(port)
+        first.release()
+        second.release()
+        assert pooled() == [second]
+        assert first.state is not taps.ConnectionState.ESTABLISHED
+        second.close()
+        server.close()
+    run(test)
+
+
+async def take_after_idle(change):
+    """ Releases a pooled connection, applies change to it and its server
+        side writer while it is idle, and checks that the next
+        initiate_with_pool closes it and returns a new connection.
+    """
+    writers = []
+    server, port = await start_server(writers)
+    first = await pooled_connection(port)
+    first.release()
+    change(first, writers[0])
+    await asyncio.sleep(0.05)
+    second = await pooled_connection(port)
+    assert second is not first
+    assert first.state is not taps.ConnectionState.ESTABLISHED
+    assert pooled() == []
+    second.close()
+    server.close()
+
+
+# Data the peer sends to an idle connection is not handed to the next user
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_take_pooled_skips_received_data():
+    run(lambda: take_after_idle(
+        lambda connection, writer: writer.write(b"stale")))
+
+
+# Idle connections whose peer sent EOF are not handed out
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_take_pooled_skips_eof():
+    run(lambda: take_after_idle(
+        lambda connection, writer: writer.write_eof()))
+
+
+# Idle connections with deframed messages are not handed out
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_take_pooled_skips_framer_buffer():
+    def deframed(connection, writer):
+        connection.transport.framer_buffer = [b"stale"]
+    run(lambda: take_after_idle(deframed))
+
+
+# Idle connections with a pending receive are not handed out
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_take_pooled_skips_waiters():
+    def waiting(connection, writer):
+        connection.transport.waiters.append(connection.loop.create_future())
+    run(lambda: take_after_idle(waiting))
@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+import socket
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import connection as taps_connection  # noqa: E402
+from pytaps.connection import _interleave  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+def test_interleave():
+    assert _interleave([1, 2, 3], ["a", "b"]) == [1, "a", 2, "b", 3]
+    assert _interleave([1], ["a", "b", "c"]) == [1, "a", "b", "c"]
+    assert _interleave([], ["a", "b"]) == ["a", "b"]
+    assert _interleave([1, 2], []) == [1, 2]
+    assert _interleave([None, 0], [False]) == [None, False, 0]
+
+
+def addrinfo(*addresses):
+    return [(socket.AF_INET6 if ":" in address else socket.AF_INET,
+             socket.SOCK_STREAM, 6, "", (address, 443))
+            for address in addresses]
+
+
+@pytest.fixture
+def attempted(monkeypatch):
+    """ Makes every connection attempt fail right away, and returns the
+        list of remote addresses in the order they were attempted.
+    """
+    order = []
+
+    async def attempt_candidate(self, candidate):
+        order.append(candidate.remote_address)
+        raise OSError("refused")
+    monkeypatch.setattr(taps.Connection, "attempt_candidate",
+                        attempt_candidate)
+    monkeypatch.setattr(taps_connection, "RACING_DELAY", 0)
+    yield order
+    taps.set_resolver(None)
+
+
+def race(host_name=None, addresses=(), answer=()):
+    """ Races a connection to host_name or addresses, resolving host_name
+        to answer, until all attempts failed.
+    """
+    async def resolve(host, port):
+        return addrinfo(*answer)
+    taps.set_resolver(resolve)
+    loop = asyncio.new_event_loop()
+    try:
+        ep = taps.RemoteEndpoint()
+        if host_name is not None:
+            ep.with_hostname(host_name)
+        for address in addresses:
+            ep.with_address(address)
+        ep.with_port(443)
+        preconnection = taps.Preconnection(remote_endpoint=ep,
+                                           event_loop=loop)
+        errors = []
+        preconnection.on_initiate_error(lambda connection:
+                                        errors.append(connection))
+        connection = taps.Connection(preconnection)
+        loop.run_until_complete(asyncio.wait_for(connection.race(),
+                                                 TEST_TIMEOUT))
+        loop.run_until_complete(asyncio.sleep(0))
+        assert errors == [connection]
+    finally:
+        loop.close()
+
+
+# Resolved addresses alternate between the families, starting with IPv6
+# if the resolver ranked an IPv6 address first
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_race_order_v6_first(attempted):
+    race("example.com", answer=("2001:db8::1", "2001:db8::2",
+                                "192.0.2.1", "192.0.2.2", "192.0.2.3"))
+    assert attempted == ["2001:db8::1", "192.0.2.1", "2001:db8::2",
+                         "192.0.2.2", "192.0.2.3"]
+
+
+# and with IPv4 if the resolver ranked an IPv4 address first
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_race_order_v4_first(attempted):
+    race("example.com", answer=("192.0.2.1", "2001:db8::1", "192.0.2.2",
+                                "2001:db8::2", "2001:db8::3"))
+    assert attempted == ["192.0.2.1", "2001:db8::1", "192.0.2.2",
+                         "2001:db8::2", "2001:db8::3"]
+
+
+# Duplicate answers are attempted once
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_race_order_drops_duplicates(attempted):
+    race("example.com", answer=("192.0.2.1", "192.0.2.1", "2001:db8::1",
+                                "2001:db8::1"))
+    assert attempted == ["192.0.2.1", "2001:db8::1"]
+
+
+# Address literals and given addresses are attempted as they are
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_race_order_literals(attempted):
+    race("192.0.2.7")
+    race(addresses=["192.0.2.1", "2001:db8::1"])
+    assert attempted == ["192.0.2.7", "192.0.2.1", "2001:db8::1"]
+
+
+# Attempts with a protocol the implementation does not know fail
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_attempt_unknown_protocol():
+    loop = asyncio.new_event_loop()
+    try:
+        ep = taps.RemoteEndpoint()
+        ep.with_address("192.0.2.1")
+        ep.with_port(443)
+        connection = taps.Connection(
+            taps.Preconnection(remote_endpoint=ep, event_loop=loop))
+        candidate = taps_connection._Candidate("sctp", "192.0.2.1")
+        with pytest.raises(ValueError):
+            loop.run_until_complete(connection.attempt_candidate(candidate))
+    finally:
+        loop.close()
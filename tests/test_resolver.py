@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import resolver  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+class CountingResolver():
+    """ Resolver that answers every host with 192.0.2.1 and counts the
+        queries, optionally waiting for release before answering.
+    """
+    def __init__(self, block=False):
+        self.queries = []
+        self.release = None
+        self.block = block
+
+    async def __call__(self, host, port):
+        self.queries.append((host, port))
+        if self.block:
+            self.release = asyncio.get_running_loop().create_future()
+            await self.release
+        return [(2, 1, 6, "", ("192.0.2.1", port))]
+
+
+@pytest.fixture
+def counting_resolver():
+    counting = CountingResolver()
+    taps.set_resolver(counting)
+    yield counting
+    taps.set_resolver(None)
+
+
+def lookup(loop, host="example.com", port=443):
+    return resolver.cached_getaddrinfo(loop, host, port)
+
+
+# A second lookup within the TTL is answered from the cache
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_cache_within_ttl(counting_resolver):
+    loop = asyncio.new_event_loop()
+    try:
+        first = loop.run_until_complete(lookup(loop))
+        second = loop.run_until_complete(lookup(loop))
+        assert first == second == [(2, 1, 6, "", ("192.0.2.1", 443))]
+        assert counting_resolver.queries == [("example.com", 443)]
+        # Other ports are separate entries
+        loop.run_until_complete(lookup(loop, port=80))
+        assert len(counting_resolver.queries) == 2
+    finally:
+        loop.close()
+
+
+# Expired entries are resolved again
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_cache_expires(counting_resolver, monkeypatch):
+    monkeypatch.setattr(resolver, "ADDRINFO_TTL", 0)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(lookup(loop))
+        loop.run_until_complete(lookup(loop))
+        assert len(counting_resolver.queries) == 2
+    finally:
+        loop.close()
+
+
+# Concurrent lookups of the same host share one query
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_inflight_shared(counting_resolver):
+    loop = asyncio.new_event_loop()
+    try:
+        async def lookup_three_times():
+            return await asyncio.gather(lookup(loop), lookup(loop),
+                                        lookup(loop))
+        results = loop.run_until_complete(lookup_three_times())
+        assert results[0] == results[1] == results[2]
+        assert len(counting_resolver.queries) == 1
+        assert not resolver._addrinfo_inflight
+    finally:
+        loop.close()
+
+
+# A lookup left running on a closed loop does not block lookups on
+# another loop, and is forgotten once another lookup starts
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_inflight_per_loop(counting_resolver):
+    counting_resolver.block = True
+    first_loop = asyncio.new_event_loop()
+    first_loop.create_task(lookup(first_loop))
+    first_loop.run_until_complete(asyncio.sleep(0.01))
+    assert len(resolver._addrinfo_inflight) == 1
+    first_loop.close()
+
+    counting_resolver.block = False
+    second_loop = asyncio.new_event_loop()
+    try:
+        result = second_loop.run_until_complete(lookup(second_loop))
+        assert result == [(2, 1, 6, "", ("192.0.2.1", 443))]
+        assert len(counting_resolver.queries) == 2
+        assert not resolver._addrinfo_inflight
+    finally:
+        second_loop.close()
+
+
+# Setting another resolver drops the answers of the previous one
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_set_resolver_clears_cache(counting_resolver):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(lookup(loop))
+        other = CountingResolver()
+        taps.set_resolver(other)
+        loop.run_until_complete(lookup(loop))
+        assert other.queries == [("example.com", 443)]
+    finally:
+        loop.close()
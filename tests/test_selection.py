@@ -0,0 +1,112 @@
+import json
+import random
+import pytest
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import transportProperties  # noqa: E402
+from pytaps.transportProperties import PreferenceLevel  # noqa: E402
+
+
+def baseline_select(protocols, properties):
+    """ The candidate selection of Connection.create_candidates before it
+        moved to bitmasks, kept here to compare the orderings against.
+    """
+    candidate_protocols = dict([(row["name"], list((0, 0)))
+                               for row in protocols])
+    for protocol in protocols:
+        for transport_property, level in properties.items():
+            if protocol["name"] not in candidate_protocols:
+                continue
+            if level is PreferenceLevel.PROHIBIT:
+                if protocol[transport_property] is True:
+                    del candidate_protocols[protocol["name"]]
+            elif level is PreferenceLevel.REQUIRE:
+                if protocol[transport_property] is False:
+                    del candidate_protocols[protocol["name"]]
+            elif level is PreferenceLevel.PREFER:
+                if protocol[transport_property] is True:
+                    candidate_protocols[protocol["name"]][0] += 1
+            elif level is PreferenceLevel.AVOID:
+                if protocol[transport_property] is True:
+                    candidate_protocols[protocol["name"]][1] -= 1
+    sorted_candidates = sorted(candidate_protocols.items(),
+                               key=lambda value: (value[1][0],
+                               value[1][1]), reverse=True)
+    return [(name, tuple(score)) for name, score in sorted_candidates]
+
+
+def protocol_properties(protocols):
+    return sorted({prop for protocol in protocols for prop in protocol
+                   if prop != "name"})
+
+
+@pytest.fixture
+def reload_after():
+    """ Rebuilds the protocol table once monkeypatch has undone its
+        changes, request it before monkeypatch.
+    """
+    yield
+    transportProperties.reload_protocols()
+
+
+# The default properties select TCP only
+def test_select_default_properties():
+    tp = taps.TransportProperties()
+    assert tp.select_protocols() == (("tcp", (0, 0)),)
+    assert list(tp.select_protocols()) == baseline_select(
+        transportProperties.get_protocols(), tp.properties)
+
+
+# Random REQUIRE/PROHIBIT/PREFER/AVOID/IGNORE combinations select and order
+# the protocols like the original algorithm
+def test_select_matches_baseline():
+    protocols = transportProperties.get_protocols()
+    props = protocol_properties(protocols)
+    rng = random.Random(0)
+    for _ in range(2000):
+        tp = taps.TransportProperties()
+        tp.properties = {}
+        for prop in rng.sample(props, rng.randint(0, len(props))):
+            tp.add(prop, rng.choice(list(PreferenceLevel)))
+        expected = baseline_select(protocols, tp.properties)
+        selected = tp.select_protocols()
+        assert isinstance(selected, tuple)
+        assert list(selected) == expected, tp.properties
+
+
+# Non-preference values like "direction" and unknown properties do not
+# affect the selection
+def test_select_ignores_other_values():
+    tp = taps.TransportProperties()
+    expected = tp.select_protocols()
+    tp.add("direction", "unidirectional-send")
+    tp.add("not-a-property", PreferenceLevel.REQUIRE)
+    assert tp.select_protocols() == expected
+
+
+# Selections are cached, and recomputed from the new table after
+# reload_protocols
+def test_select_cache_cleared_on_reload(reload_after, monkeypatch):
+    tp = taps.TransportProperties()
+    tp.properties = {"reliability": PreferenceLevel.PROHIBIT}
+    assert tp.select_protocols() == (("udp", (0, 0)),)
+    assert tp.select_protocols() is tp.select_protocols()
+
+    protocols = transportProperties.get_protocols()
+    for protocol in protocols:
+        protocol["reliability"] = protocol["name"] == "udp"
+    monkeypatch.setattr(transportProperties, "get_protocols",
+                        lambda: json.loads(json.dumps(protocols)))
+    transportProperties.reload_protocols()
+    assert tp.select_protocols() == (("tcp", (0, 0)),)
+    assert list(tp.select_protocols()) == baseline_select(protocols,
+                                                          tp.properties)
+
+
+# The table is rebuilt from the real protocols after the previous test
+def test_select_after_reload_restores_table():
+    tp = taps.TransportProperties()
+    tp.properties = {"reliability": PreferenceLevel.PROHIBIT}
+    assert tp.select_protocols() == (("udp", (0, 0)),)
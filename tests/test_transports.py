@@ -0,0 +1,218 @@
+import asyncio
+import pytest
+import socket
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+import pytaps as taps  # noqa: E402
+from pytaps import transports as taps_transports  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+def tcp_transport(loop, profile="default", framer=None):
+    """ Returns a TcpTransport of a passive connection with the given
+        capacity profile and framer, not yet attached to a socket.
+    """
+    tp = taps.TransportProperties()
+    tp.add("capacity-profile", profile)
+    preconnection = taps.Preconnection(transport_properties=tp,
+                                       event_loop=loop)
+    if framer is not None:
+        preconnection.add_framer(framer)
+    connection = taps.Connection(preconnection)
+    return taps_transports.TcpTransport(connection,
+                                        connection.local_endpoint,
+                                        taps.RemoteEndpoint())
+
+
+def with_tcp_socket(test):
+    """ Runs test with a loop and the client transport of a local TCP
+        connection.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        async def run():
+            server = await asyncio.start_server(lambda r, w: None,
+                                                "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                           port)
+            try:
+                await test(loop, writer.transport)
+            finally:
+                writer.close()
+                server.close()
+        loop.run_until_complete(asyncio.wait_for(run(), TEST_TIMEOUT))
+    finally:
+        loop.close()
+
+
+# Low-latency profiles disable Nagle's algorithm
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_capacity_profile_low_latency():
+    async def test(loop, transport):
+        sock = transport.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+        tcp = tcp_transport(loop, "low-latency/interactive")
+        tcp.apply_capacity_profile(transport)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+    with_tcp_socket(test)
+
+
+# Capacity-seeking connections keep the receive buffer the kernel chose,
+# so that autotuning can grow it
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_capacity_profile_capacity_seeking():
+    async def test(loop, transport):
+        sock = transport.get_extra_info("socket")
+        rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        tcp = tcp_transport(loop, "capacity-seeking")
+        tcp.apply_capacity_profile(transport)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) == rcvbuf
+    with_tcp_socket(test)
+
+
+class LineFramer(taps.Framer):
+    """ Framer for newline terminated messages, counting its calls.
+    """
+    def __init__(self, consume=True):
+        super().__init__()
+        self.consume = consume
+        self.calls = 0
+
+    async def handle_received_data(self, connection):
+        self.calls += 1
+        if self.calls > 100:
+            raise taps.DeframingFailed
+        byte_stream, context, eom = connection.parse()
+        end = byte_stream.find(b"\n")
+        if end < 0:
+            raise taps.DeframingFailed
+        return context, bytes(byte_stream[:end]), \
+            end + 1 if self.consume else 0, True
+
+
+# Messages that arrive in one chunk while reads are waiting are all
+# delivered, and the deframer ends once the connection is lost
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_deframe_chunk_then_connection_lost():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            tcp = tcp_transport(loop, framer=LineFramer())
+            received = []
+            tcp.connection.on_received(
+                lambda data, context, connection: received.append(data))
+            for _ in range(3):
+                tcp.receive(float("inf"), -1)
+            await asyncio.sleep(0)
+            tcp.data_received(b"one\ntwo\nthree\n")
+            tcp.connection_lost(None)
+            await asyncio.wait_for(tcp.deframer, TEST_TIMEOUT)
+            await asyncio.sleep(0.01)
+            assert received == [b"one", b"two", b"three"]
+        loop.run_until_complete(test())
+    finally:
+        loop.close()
+
+
+# A framer that does not consume any data stops deframing instead of
+# being called again with the same data
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_deframe_without_progress_stops():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            framer = LineFramer(consume=False)
+            tcp = tcp_transport(loop, framer=framer)
+            tcp.data_received(b"one\n")
+            await asyncio.sleep(0.01)
+            assert framer.calls == 1
+            assert tcp.framer_buffer == []
+            tcp.connection_lost(None)
+            await asyncio.wait_for(tcp.deframer, TEST_TIMEOUT)
+        loop.run_until_complete(test())
+    finally:
+        loop.close()
+
+
+def receive_twice(transport, first, second):
+    """ Starts two receives on transport at once, then delivers first and
+        second with the receive callback of the transport's type, and
+        returns what the receives got.
+    """
+    async def test():
+        received = []
+        transport.connection.on_received(
+            lambda data, context, connection: received.append(data))
+        transport.connection.on_received_partial(
+            lambda data, context, eom, connection: received.append(data))
+        transport.receive(1, -1)
+        transport.receive(1, -1)
+        await asyncio.sleep(0)
+        assert len(transport.waiters) == 2
+        for data in (first, second):
+            if isinstance(transport, taps_transports.UdpTransport):
+                transport.datagram_received(data, ("192.0.2.1", 1234))
+            else:
+                transport.data_received(data)
+            await asyncio.sleep(0.01)
+        assert not transport.waiters
+        return received
+    return transport.loop.run_until_complete(
+        asyncio.wait_for(test(), TEST_TIMEOUT))
+
+
+# Concurrent receives on a UDP connection each get their own datagram
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_concurrent_receives_udp():
+    loop = asyncio.new_event_loop()
+    try:
+        tp = taps.TransportProperties()
+        preconnection = taps.Preconnection(transport_properties=tp,
+                                           event_loop=loop)
+        connection = taps.Connection(preconnection)
+        udp = taps_transports.UdpTransport(connection,
+                                           connection.local_endpoint,
+                                           taps.RemoteEndpoint())
+        assert receive_twice(udp, b"one", b"two") == [b"one", b"two"]
+    finally:
+        loop.close()
+
+
+# Concurrent receives on a TCP connection each get their own data
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_concurrent_receives_tcp():
+    loop = asyncio.new_event_loop()
+    try:
+        tcp = tcp_transport(loop)
+        assert receive_twice(tcp, b"one", b"two") == [b"one", b"two"]
+    finally:
+        loop.close()
+
+
+# A cancelled receive does not take the place of one still waiting
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_cancelled_receive_keeps_other_waiting():
+    loop = asyncio.new_event_loop()
+    try:
+        async def test():
+            tcp = tcp_transport(loop)
+            received = []
+            tcp.connection.on_received_partial(
+                lambda data, context, eom, connection: received.append(data))
+            tcp.receive(1, -1)
+            tcp.receive(1, -1)
+            await asyncio.sleep(0)
+            first, second = tcp.waiters
+            second.cancel()
+            await asyncio.sleep(0)
+            assert list(tcp.waiters) == [first]
+            tcp.data_received(b"one")
+            await asyncio.sleep(0.01)
+            assert received == [b"one"]
+        loop.run_until_complete(asyncio.wait_for(test(), TEST_TIMEOUT))
+    finally:
+        loop.close()
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import pytest
+import sys
+
+sys.path.append(sys.path[0] + "/..")
+from pytaps.utility import schedule_callback, is_multicast_address  # noqa
+from pytaps.utility import is_ip_literal  # noqa: E402
+from pytaps.utility import positive_number_from_env  # noqa: E402
+
+
+TEST_TIMEOUT = 5
+
+
+def run_callback(callback):
+    """ Schedules callback with schedule_callback, runs the loop until it
+        has been issued and returns the arguments it was called with.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        calls = []
+        done = loop.create_future()
+
+        async def record(*args):
+            calls.append(args)
+            done.set_result(None)
+
+        schedule_callback(loop, callback(record), "event", 1)
+        loop.run_until_complete(asyncio.wait_for(done, TEST_TIMEOUT))
+        return calls
+    finally:
+        loop.close()
+
+
+# Coroutine functions are run as a task
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_schedule_coroutine_function():
+    assert run_callback(lambda record: record) == [("event", 1)]
+
+
+# Plain functions are called on the next loop iteration
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_schedule_plain_function():
+    def plain(record):
+        def callback(*args):
+            asyncio.ensure_future(record(*args))
+        return callback
+    assert run_callback(plain) == [("event", 1)]
+
+
+# Callables that return a coroutine, e.g. a lambda or functools.partial
+# wrapping a coroutine function, still have the coroutine run
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_schedule_lambda_returning_coroutine():
+    assert run_callback(
+        lambda record: lambda *args: record(*args)) == [("event", 1)]
+
+
+@pytest.mark.timeout(TEST_TIMEOUT)
+def test_schedule_partial_of_coroutine_function():
+    assert run_callback(
+        lambda record: functools.partial(record, "partial")) == \
+        [("partial", "event", 1)]
+
+
+def test_is_multicast_address():
+    assert is_multicast_address("224.0.0.1")
+    assert is_multicast_address("239.255.255.255")
+    assert not is_multicast_address("223.255.255.255")
+    assert not is_multicast_address("240.0.0.1")
+    assert is_multicast_address("ff02::1")
+    assert is_multicast_address("ff02::1%lo")
+    assert not is_multicast_address("fe80::1")
+    with pytest.raises(OSError):
+        is_multicast_address("localhost")
+
+
+# Only addresses inet_pton accepts skip resolution, names and shorthand
+# forms that getaddrinfo would expand still get resolved
+@pytest.mark.parametrize("host, literal", [
+    ("127.0.0.1", True),
+    ("192.0.2.255", True),
+    ("::1", True),
+    ("2001:db8::1", True),
+    ("fe80::1%eth0", True),
+    ("::ffff:192.0.2.1", True),
+    ("localhost", False),
+    ("example.com", False),
+    ("127.1", False),
+    ("256.0.0.1", False),
+    ("", False),
+])
+def test_is_ip_literal(host, literal):
+    assert is_ip_literal(host) is literal
+
+
+# Unset variables give the default, set ones are converted
+def test_positive_number_from_env(monkeypatch):
+    monkeypatch.delenv("PYTAPS_TEST_NUMBER", raising=False)
+    assert positive_number_from_env("PYTAPS_TEST_NUMBER", 60) == 60
+    monkeypatch.setenv("PYTAPS_TEST_NUMBER", "2.5")
+    assert positive_number_from_env("PYTAPS_TEST_NUMBER", 60) == 2.5
+    monkeypatch.setenv("PYTAPS_TEST_NUMBER", "12")
+    assert positive_number_from_env("PYTAPS_TEST_NUMBER", 60, int) == 12
+
+
+# Malformed and non-positive values fall back to the default with a warning
+@pytest.mark.parametrize("value", ["", "abc", "0", "-1", "nan", "1.5"])
+def test_positive_number_from_env_invalid(monkeypatch, caplog, value):
+    monkeypatch.setenv("PYTAPS_TEST_NUMBER", value)
+    assert positive_number_from_env("PYTAPS_TEST_NUMBER", 7, int) == 7
+    assert "PYTAPS_TEST_NUMBER" in caplog.text